@@ -0,0 +1,124 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from google.genai import errors
+
+# Deterministic, offline stand-ins for Gemini, Groq and the RapidAPI inflation feed.
+# Same input -> same answer, so benchmark runs are comparable; latency and 429s
+# are injected from a seeded RNG.
+
+VENDORS = [f"Vendor {i:03d}" for i in range(50)]
+ITEMS = [f"item {i:04d}" for i in range(500)]
+DOC_TYPES = ["inv_rec", "inv_sent", "rec_rec", "rec_sent"]
+
+
+def _seed_for(data):
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big")
+
+
+def fake_document(image_bytes):
+    """The extraction a document 'should' produce, derived from its bytes."""
+    rng = random.Random(_seed_for(image_bytes))
+    items = [{"name": rng.choice(ITEMS), "qty": rng.randint(1, 20), "price": round(rng.uniform(1, 100), 2)}
+             for _ in range(rng.randint(1, 8))]
+    return {
+        "type": rng.choice(DOC_TYPES),
+        "vendor_name": rng.choice(VENDORS),
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "total": round(sum(i["qty"] * i["price"] for i in items), 2),
+        "items": items,
+        "confidence_score": rng.choice([95, 95, 95, 80]),
+    }
+
+
+def _rate_limited(retry_delay):
+    return errors.ClientError(429, {"error": {
+        "code": 429, "message": "Resource has been exhausted (fake)", "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_delay}s"}],
+    }})
+
+
+class FakeGemini:
+    """Stands in for genai.Client: only client.models.generate_content() is used."""
+
+    def __init__(self, latency=0.05, jitter=0.02, rate_limit_ratio=0.0, retry_delay=0.05, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_delay = retry_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rate_limited = 0
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            self.calls += 1
+            limited = self.rng.random() < self.rate_limit_ratio
+            delay = max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0)
+            if limited:
+                self.rate_limited += 1
+        time.sleep(delay)
+        if limited:
+            raise _rate_limited(self.retry_delay)
+
+        images = [c.inline_data.data for c in contents if getattr(c, "inline_data", None)]
+        if len(images) > 1 and str(contents[0]).lstrip().startswith("You are given"):
+            answer = [dict(fake_document(data), index=i) for i, data in enumerate(images)]
+        else:
+            answer = fake_document(images[0] if images else b"")
+        return SimpleNamespace(text=json.dumps(answer))
+
+
+class FakeGroq:
+    """Stands in for groq.Groq: chat completions (plain and streamed) and Whisper."""
+
+    def __init__(self, latency=0.2, token_latency=0.005, answer="The ledger looks healthy. " * 8):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.answer = answer
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def _create(self, messages, model, tools=None, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if not stream:
+            message = SimpleNamespace(content=self.answer, tool_calls=None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return self._stream()
+
+    def _stream(self):
+        for word in self.answer.split(" "):
+            time.sleep(self.token_latency)
+            delta = SimpleNamespace(content=word + " ", tool_calls=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    def _transcribe(self, file, model, **kwargs):
+        time.sleep(self.latency)
+        return "how much do we owe our vendors"
+
+
+def fake_inflation_backend(rate=4.0, latency=0.0):
+    """A MarketDataProvider backend (zero-argument callable)."""
+    def backend():
+        time.sleep(latency)
+        return rate
+    return backend
+
+
+def install(gemini=None, groq=None, inflation=None):
+    """Swaps the live clients for fakes. Call after the env vars are set and before any work."""
+    from src import clients, market_watcher
+
+    gemini = gemini or FakeGemini()
+    groq = groq or FakeGroq()
+    clients.set_client("gemini", gemini)
+    clients.set_client("groq", groq)
+    market_watcher.provider.set_backend(inflation or fake_inflation_backend())
+    return gemini, groq
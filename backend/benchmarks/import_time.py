@@ -0,0 +1,88 @@
+import os
+import ast
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Cold-start cost: each target is imported in a fresh interpreter (nothing cached
+# in sys.modules), `runs` times, and the median wall time is kept.
+# Usage (from backend/):
+#     python benchmarks/import_time.py            # table of all targets
+#     python benchmarks/import_time.py --top 15   # + the slowest modules of each (python -X importtime)
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def script_imports(path):
+    """The top-level import statements of a script (what `streamlit run` pays before drawing anything)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+TARGETS = {
+    "app": script_imports(os.path.join(BASE_PATH, "main.py")),
+    "worker": "import src.job_queue, src.ingestion, src.migrations",
+    "assistant": "import src.bot_engine",
+    "analytics": "import src.viz_engine",
+}
+
+_PROBE = """
+import time
+_t = time.perf_counter()
+{code}
+print(round((time.perf_counter() - _t) * 1000, 2))
+"""
+
+
+def _run(code, extra_args=()):
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=BASE_PATH, capture_output=True, text=True, check=True,
+    )
+
+
+def measure(code, runs=5):
+    """Median import time in ms of `code` in a fresh interpreter."""
+    probe = _PROBE.format(code=code)
+    return statistics.median(float(_run(probe).stdout.strip().splitlines()[-1]) for _ in range(runs))
+
+
+def slowest_modules(code, top=10):
+    """[(cumulative ms, module)] from python -X importtime, slowest first."""
+    rows = []
+    for line in _run(code, ("-X", "importtime")).stderr.splitlines():
+        parts = line.split("|")
+        # Nested modules are listed too (their time is also inside their parent's)
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1000, parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure_all(runs=5):
+    return {f"import_{name}_ms": round(measure(code, runs), 1) for name, code in TARGETS.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import time of the app, the worker and optional features.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imported modules per target")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = measure_all(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, ms in results.items():
+        print(f"⏱️  {name:<24} {ms:>8.1f} ms")
+    if args.top:
+        for name, code in TARGETS.items():
+            print(f"\n🐢 {name}")
+            for ms, module in slowest_modules(code, args.top):
+                print(f"   {ms:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+# Offline benchmark suite: every run gets a throw-away workspace (ledger, caches,
+# metrics) and fake Gemini / Groq / inflation backends, so numbers only depend on
+# this code and this machine. Usage (from backend/):
+#     python benchmarks/run_benchmarks.py                       # run + compare with baseline.json
+#     python benchmarks/run_benchmarks.py --sizes 1000,1000000  # 10^3 .. 10^6 bucket lines
+#     python benchmarks/run_benchmarks.py --save-baseline
+#     python benchmarks/run_benchmarks.py --save-baseline --save-scopes startup   # re-record one area only
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.dirname(BENCH_PATH)
+sys.path.insert(0, BASE_PATH)
+# The bot reads its code context from src/ relative to backend/
+os.chdir(BASE_PATH)
+DEFAULT_BASELINE = os.path.join(BENCH_PATH, "baseline.json")
+
+WORKSPACE = tempfile.mkdtemp(prefix="erp-bench-")
+os.environ.update({
+    "ENGINE_DB_PATH": os.path.join(WORKSPACE, "engine_master.db"),
+    "EXTRACTION_CACHE_PATH": os.path.join(WORKSPACE, "extraction_cache.db"),
+    "METRICS_DB_PATH": os.path.join(WORKSPACE, "metrics.db"),
+    "MARKET_CACHE_PATH": os.path.join(WORKSPACE, "market_cache.json"),
+    "GEMINI_RPM": "100000",  # the fake has no quota; 429s are injected instead
+    "TELEMETRY": "0",
+})
+
+import PIL.Image
+import fakes
+import import_time
+import synthetic_ledger
+from src import database_manager, data_cache, fuzzy_match
+from src.migrations import run_migrations
+from src.ingestion import ingest_files
+from src.analyzer import reconcile_receipt
+from src.bot_engine import stream_financial_bot
+import src.ledger_queries as lq
+import src.viz_engine as viz
+
+# Higher is better for these; every other metric is a duration (lower is better)
+HIGHER_IS_BETTER = {"ingest_docs_per_s"}
+
+
+def reset_ledger():
+    database_manager.close_all()
+    for suffix in ("", "-wal", "-shm"):
+        path = database_manager.DB_PATH + suffix
+        if os.path.exists(path):
+            os.remove(path)
+    run_migrations()
+    data_cache.clear()
+    fuzzy_match.reset_index()
+
+
+def timed_ms(fn, repeat=5):
+    """Median wall time of fn() in ms."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+# --- BENCHMARKS ---
+
+def bench_ingestion(docs, workers, gemini):
+    """Scan -> extract (fake Gemini, with latency and 429s) -> commit, through ingest_files()."""
+    reset_ledger()
+    folder = os.path.join(WORKSPACE, "scans")
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(docs):
+        path = os.path.join(folder, f"scan_{i:05d}.png")
+        PIL.Image.new("L", (400, 560), color=255 - i % 200).save(path)
+        paths.append(path)
+
+    calls, limited = gemini.calls, gemini.rate_limited
+    started = time.perf_counter()
+    ok = sum(1 for result in ingest_files(paths, max_workers=workers) if result["ok"])
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(folder)
+    return {
+        "ingest_docs_per_s": round(ok / elapsed, 2),
+        "ingest_ms_per_doc": round(elapsed * 1000 / max(ok, 1), 3),
+        "_ingest_model_calls": gemini.calls - calls,
+        "_ingest_rate_limited": gemini.rate_limited - limited,
+        "_ingest_failed": docs - ok,
+    }
+
+
+def bench_dashboard(repeat):
+    """Cold (cache cleared) render queries of every dashboard view."""
+    entity_id = next(iter(lq.entity_options().values()), None)
+
+    def cold(fn):
+        def run():
+            data_cache.clear()
+            fn()
+        return timed_ms(run, repeat)
+
+    return {
+        "dash_invoices_page_ms": cold(lambda: lq.audit_page("inv_sent")),
+        "dash_invoices_filtered_ms": cold(lambda: lq.audit_page("inv_sent", status="Partial", date_from="2024-01-01", entity_id=entity_id)),
+        "dash_receipts_page_ms": cold(lambda: lq.audit_page("rec_sent")),
+        "dash_bucket_page_ms": cold(lambda: lq.bucket_page("payment_to_be_received_inv", status="Incomplete")),
+        "dash_merit_trail_ms": cold(lambda: lq.merit_trail_page(entity_id=entity_id)),
+        "dash_entity_scores_ms": cold(lq.entity_scores),
+        "dash_item_totals_ms": cold(lq.item_totals),
+        "dash_fulfillment_chart_ms": cold(viz.get_fulfillment_chart),
+        "dash_debt_chart_ms": cold(viz.get_debt_exposure_chart),
+        "dash_merit_chart_ms": cold(viz.get_merit_trend_chart),
+    }
+
+
+def bench_reconciliation(receipts, lines_per_receipt):
+    """reconcile_receipt() on receipts built from open lines; 1 in 10 names is an OCR variant."""
+    open_items = synthetic_ledger.open_receivable_items(receipts * lines_per_receipt)
+    if not open_items:
+        return {}
+    total_lines = 0
+    started = time.perf_counter()
+    for r in range(receipts):
+        chunk = open_items[r * lines_per_receipt:(r + 1) * lines_per_receipt]
+        items = [{"name": name.upper() + "s" if i % 10 == 0 else name, "qty": qty, "price": 1.0}
+                 for i, (name, qty) in enumerate(chunk)]
+        if not items:
+            break
+        reconcile_receipt(f"BENCH-R{r:05d}", items, "2026-01-01")
+        total_lines += len(items)
+    elapsed = time.perf_counter() - started
+    return {"reconcile_ms_per_line": round(elapsed * 1000 / max(total_lines, 1), 4)}
+
+
+def bench_chat(groq, repeat):
+    """Prompt build + streamed answer from the fake Groq (fixed latency subtracted)."""
+    def run():
+        for _ in stream_financial_bot("How much do our clients owe us for item 0001?", []):
+            pass
+    fixed = (groq.latency + groq.token_latency * len(groq.answer.split(" "))) * 1000
+    return {"chat_overhead_ms": round(max(timed_ms(run, repeat) - fixed, 0), 3)}
+
+
+def run_size(size, args):
+    reset_ledger()
+    started = time.perf_counter()
+    summary = synthetic_ledger.generate(size, seed=args.seed)
+    result = {"_generate_s": round(time.perf_counter() - started, 2), "_rows": summary}
+    print(f"🏗️  {size:>9,} lines: ledger generated in {result['_generate_s']}s")
+    result.update(bench_dashboard(args.repeat))
+    result.update(bench_reconciliation(args.receipts, args.lines_per_receipt))
+    return result
+
+
+# --- BASELINE COMPARISON ---
+
+def compare(results, baseline, tolerance):
+    """Prints a table against the baseline; returns the list of regressions."""
+    regressions = []
+    for scope, metrics in results.items():
+        base_metrics = baseline.get(scope, {})
+        print(f"\n📏 {scope}")
+        for name, value in metrics.items():
+            if name.startswith("_"):
+                continue
+            base = base_metrics.get(name)
+            if not isinstance(base, (int, float)) or not base:
+                print(f"   {name:<28} {value:>12}   (no baseline)")
+                continue
+            change = (value - base) / base
+            worse = -change if name in HIGHER_IS_BETTER else change
+            flag = "🔴" if worse > tolerance else "🟢" if worse < -tolerance else "⚪"
+            print(f"   {name:<28} {value:>12}   baseline {base:>10}   {change:+.0%} {flag}")
+            if worse > tolerance:
+                regressions.append(f"{scope}.{name}: {base} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks: startup, ingestion, reconciliation, dashboard queries.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated ledger sizes (bucket lines)")
+    parser.add_argument("--docs", type=int, default=100, help="documents for the ingestion benchmark")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Gemini latency (s)")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05, help="share of fake Gemini calls answered with 429")
+    parser.add_argument("--receipts", type=int, default=50)
+    parser.add_argument("--lines-per-receipt", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--save-scopes", help="with --save-baseline: only replace these scopes (e.g. startup,chat), keep the rest")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--output", help="also write the raw results to this JSON file")
+    args = parser.parse_args()
+
+    gemini = fakes.FakeGemini(latency=args.latency, rate_limit_ratio=args.rate_limit_ratio, seed=args.seed)
+    groq = fakes.FakeGroq()
+    fakes.install(gemini=gemini, groq=groq)
+
+    results = {"startup": import_time.measure_all(args.repeat)}
+    try:
+        print(f"🚀 Ingesting {args.docs} documents with {args.workers} workers (fake Gemini {args.latency * 1000:.0f} ms, {args.rate_limit_ratio:.0%} 429s)")
+        results["ingestion"] = bench_ingestion(args.docs, args.workers, gemini)
+        results["chat"] = bench_chat(groq, args.repeat)
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            results[f"ledger_{size}"] = run_size(size, args)
+    finally:
+        database_manager.close_all()
+        shutil.rmtree(WORKSPACE, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.save_baseline:
+        # A change to one area should not re-record (and hide drift in) the others
+        scopes = [s.strip() for s in (args.save_scopes or "").split(",") if s.strip()] or list(results)
+        baseline.update({scope: results[scope] for scope in scopes if scope in results})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"💾 Baseline written to {args.baseline} ({', '.join(scope for scope in scopes if scope in results)})")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ Regressions:\n   " + "\n   ".join(regressions))
+        return 1
+    print("\n✨ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
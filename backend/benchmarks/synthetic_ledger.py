@@ -0,0 +1,103 @@
+import random
+from datetime import date, timedelta
+from src.database_manager import transaction
+
+# Fills the ledger with a realistic-looking history: `size` bucket lines spread over
+# invoices of both directions, receipts settling part of them, and a merit trail.
+# Rows are written with executemany in fixed-size transactions, so memory stays flat
+# even at 10^6 lines. The v3 triggers keep the dashboard summaries up to date.
+
+CHUNK_ROWS = 50_000
+LINES_PER_INVOICE = 5
+START_DATE = date(2023, 1, 1)
+DAYS = 3 * 365
+
+
+def _flush(rows):
+    with transaction() as conn:
+        for sql, batch in rows.items():
+            if batch:
+                conn.executemany(sql, batch)
+                batch.clear()
+
+
+def generate(size, seed=0, settled_ratio=0.5, lines_per_invoice=LINES_PER_INVOICE):
+    """Writes ~`size` invoice lines (plus receipts and trail rows). Returns a summary dict."""
+    rng = random.Random(seed)
+    n_entities = max(10, size // 1000)
+    items = [f"item {i:04d}" for i in range(max(50, min(size // 20, 5000)))]
+    n_invoices = max(1, size // lines_per_invoice)
+
+    with transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO entity_master (name) VALUES (?)",
+                         [(f"Vendor {i:04d}",) for i in range(n_entities)] + [(f"Client {i:04d}",) for i in range(n_entities)])
+        ids = dict(conn.execute("SELECT name, id FROM entity_master").fetchall())
+    vendor_ids = [ids[f"Vendor {i:04d}"] for i in range(n_entities)]
+    client_ids = [ids[f"Client {i:04d}"] for i in range(n_entities)]
+
+    sql = {
+        "inv_sent": "INSERT OR IGNORE INTO inv_sent (id, client_id, date, total, status) VALUES (?, ?, ?, ?, ?)",
+        "inv_rec": "INSERT OR IGNORE INTO inv_rec (id, vendor_id, date, total, status) VALUES (?, ?, ?, ?, ?)",
+        "items": "INSERT OR IGNORE INTO document_items (doc_type, doc_id, line_no, item_name, qty, price) VALUES (?, ?, ?, ?, ?, ?)",
+        "receivable": "INSERT INTO payment_to_be_received_inv (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status) VALUES (?, ?, ?, ?, ?, ?)",
+        "payable": "INSERT INTO payment_to_be_sent_inv (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status) VALUES (?, ?, ?, ?, ?, ?)",
+        "rec_sent": "INSERT OR IGNORE INTO rec_sent (id, inv_id, date, amount, status, entity_id) VALUES (?, ?, ?, ?, ?, ?)",
+        "received": "INSERT INTO payment_received_rec (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status) VALUES (?, ?, ?, ?, ?, ?)",
+        "trail": "INSERT INTO merit_audit_trail (entity_id, change, reason, timestamp) VALUES (?, ?, ?, ?)",
+    }
+    rows = {statement: [] for statement in sql.values()}
+    pending = 0
+    lines = receipts = 0
+
+    for n in range(n_invoices):
+        outgoing = n % 2 == 0   # alternate invoices we send / invoices we receive
+        doc_type = "inv_sent" if outgoing else "inv_rec"
+        doc_id = f"SYN-{doc_type}-{seed}-{n:07d}"
+        entity_id = rng.choice(client_ids if outgoing else vendor_ids)
+        day = START_DATE + timedelta(days=rng.randrange(DAYS))
+        settled = rng.random() < settled_ratio
+
+        doc_items, paid = [], []
+        for _ in range(lines_per_invoice):
+            name, qty, price = rng.choice(items), rng.randint(1, 20), round(rng.uniform(1, 100), 2)
+            doc_items.append({"name": name, "qty": qty, "price": price})
+            fulfilled = qty if settled else rng.choice([0, 0, qty // 2])
+            status = "Completed" if fulfilled >= qty else "Partial" if fulfilled else "Incomplete"
+            rows[sql["receivable" if outgoing else "payable"]].append((doc_id, name, qty, fulfilled, price, status))
+            if outgoing and fulfilled:
+                paid.append((name, fulfilled, price))
+        lines += len(doc_items)
+
+        total = round(sum(i["qty"] * i["price"] for i in doc_items), 2)
+        header_status = "Completed" if settled else "Partial" if paid else "Incomplete"
+        rows[sql[doc_type]].append((doc_id, entity_id, day.isoformat(), total, header_status))
+        rows[sql["items"]].extend((doc_type, doc_id, n, i["name"], i["qty"], i["price"]) for n, i in enumerate(doc_items, 1))
+
+        if paid:
+            receipt_id = f"SYN-rec-{seed}-{n:07d}"
+            receipts += 1
+            rows[sql["rec_sent"]].append((receipt_id, doc_id, (day + timedelta(days=rng.randint(1, 60))).isoformat(),
+                                          round(sum(q * p for _, q, p in paid), 2), "Completed", entity_id))
+            rows[sql["items"]].extend(("rec_sent", receipt_id, n, name, q, p) for n, (name, q, p) in enumerate(paid, 1))
+            rows[sql["received"]].extend((receipt_id, name, q, q, p, "Completed") for name, q, p in paid)
+
+        rows[sql["trail"]].append((entity_id, 1, "New document processed successfully", f"{day.isoformat()}T12:00:00"))
+
+        pending += 2 * (len(doc_items) + len(paid)) + 2
+        if pending >= CHUNK_ROWS:
+            _flush(rows)
+            pending = 0
+
+    _flush(rows)
+    return {"lines": lines, "invoices": n_invoices, "receipts": receipts, "entities": 2 * n_entities, "items": len(items)}
+
+
+def open_receivable_items(limit, seed=0):
+    """A sample of (item_name, open qty) from open receivable lines, for reconciliation runs."""
+    from src.database_manager import get_conn
+    rows = get_conn().execute("""
+        SELECT item_name, qty_total - qty_fulfilled FROM payment_to_be_received_inv
+        WHERE status != 'Completed' ORDER BY item_id LIMIT ?
+    """, (limit * 4,)).fetchall()
+    random.Random(seed).shuffle(rows)
+    return rows[:limit]
@@ -0,0 +1,59 @@
+import os
+import sys
+import argparse
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_PATH)
+
+# Usage (from anywhere):
+#     python bulk_ledger.py import history.csv --rejects rejects.csv
+#     python bulk_ledger.py import receipts.parquet --reconcile --book-merit
+#     python bulk_ledger.py export ledger.parquet --types inv_sent,rec_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import / export of the ledger as CSV or Parquet.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="load a CSV / Parquet file (one row per document line)")
+    imp.add_argument("path")
+    imp.add_argument("--batch-rows", type=int, default=None, help="lines per transaction")
+    imp.add_argument("--book-merit", action="store_true", help="book imported documents as scans (merit trail dated with each document)")
+    imp.add_argument("--reconcile", action="store_true", help="settle rec_sent receipts against open invoices")
+    imp.add_argument("--rejects", help="write invalid documents and their errors to this CSV")
+
+    exp = sub.add_parser("export", help="write the ledger to a CSV / Parquet file")
+    exp.add_argument("path")
+    exp.add_argument("--types", default="inv_rec,inv_sent,rec_rec,rec_sent")
+    exp.add_argument("--chunk-rows", type=int, default=None)
+    args = parser.parse_args()
+    doc_types = [t.strip() for t in getattr(args, "types", "").split(",") if t.strip()]
+    if not set(doc_types) <= {"inv_rec", "inv_sent", "rec_rec", "rec_sent"}:
+        parser.error("--types must be a comma-separated subset of inv_rec,inv_sent,rec_rec,rec_sent")
+
+    # File arguments are relative to where we were called from; the ledger is relative to backend/
+    path = os.path.abspath(args.path)
+    rejects = os.path.abspath(args.rejects) if getattr(args, "rejects", None) else None
+    os.chdir(BASE_PATH)
+
+    from src.migrations import run_migrations
+    from src import bulk_io
+    run_migrations()
+
+    if args.command == "import":
+        summary = bulk_io.import_ledger(path, batch_rows=args.batch_rows or bulk_io.BATCH_ROWS,
+                                        book_merit=args.book_merit, reconcile=args.reconcile, rejects_path=rejects)
+        print(f"✨ Imported {summary['documents']} documents / {summary['lines']} lines "
+              f"({summary['skipped']} already in the ledger, {summary['rejected']} rejected)")
+        for error in summary["errors"]:
+            print(f"   ⚠️ {error}")
+        return 1 if summary["rejected"] else 0
+
+    written = bulk_io.export_ledger(path, doc_types=doc_types,
+                                    chunk_rows=args.chunk_rows or bulk_io.BATCH_ROWS)
+    print(f"✨ Export complete: {written}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
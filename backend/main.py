@@ -1,21 +1,25 @@
 import streamlit as st
-import pandas as pd
 import os
-import shutil
 import time
-from io import BytesIO
-from groq import Groq  # USING GROQ FOR VOICE TOO
-from streamlit_mic_recorder import mic_recorder
+import shutil
 from dotenv import load_dotenv # Ensure env vars are loaded
-from src.database_manager import get_conn
-import src.viz_engine as viz
-from src.processor import process_scanned_document
-from src.bot_engine import ask_financial_bot 
+from src.migrations import run_migrations
+import src.ledger_queries as lq
+from src.ingestion import ingest_files
+from src.extractor import BATCH_SIZE
+from src import extraction_cache, data_cache, telemetry
 
 # Load environment variables (for GROQ_API_KEY)
 load_dotenv()
 
+# Heavy, optional parts load on first use (Python caches them for later reruns):
+# plotly with the Analytics view, Groq + the mic widget with the assistant.
+
 st.set_page_config(page_title="AI Micro-ERP Intelligence", layout="wide")
+rerun_started = time.perf_counter()
+
+# Upgrade the ledger schema in place (no-op once it is current)
+run_migrations()
 
 # --- INITIALIZE SESSION STATE ---
 if "chat_history" not in st.session_state:
@@ -30,46 +34,71 @@ def get_status_style(val):
     if val == 'Completed': return 'color: #00ff00; font-weight: bold'  
     return ''
 
+# --- PAGINATION HELPERS ---
+STATUS_OPTIONS = ["", "Incomplete", "Partial", "Completed"]
+
+def audit_filters(view):
+    """Status / date range / entity filters shared by both tables of a view."""
+    with st.expander("🔎 Filters"):
+        f1, f2, f3 = st.columns(3)
+        status = f1.selectbox("Status", STATUS_OPTIONS, key=f"{view}_status")
+        dates = f2.date_input("Date range", value=[], key=f"{view}_dates")
+        entities = lq.entity_options()
+        who = f3.selectbox("Vendor / Client", ["All"] + list(entities), key=f"{view}_entity")
+    return {
+        "status": status or None,
+        "date_from": dates[0] if len(dates) > 0 else None,
+        "date_to": dates[1] if len(dates) > 1 else None,
+        "entity_id": entities.get(who),
+    }
+
+def paged_table(label, key, fetch, **filters):
+    """Renders one keyset-paginated table with Prev/Next buttons (cursor stack in session_state)."""
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    signature = repr(sorted(filters.items()))
+    if st.session_state.get(f"{key}_filters") != signature:
+        st.session_state[f"{key}_filters"] = signature
+        cursors[:] = [None]
+
+    df, next_cursor = fetch(after=cursors[-1], **filters)
+    st.write(f"**{label}**")
+    if 'status' in df.columns:
+        st.dataframe(df.style.map(get_status_style, subset=['status']), use_container_width=True)
+    else:
+        st.dataframe(df, use_container_width=True)
+
+    c_prev, c_page, c_next = st.columns([1, 2, 1])
+    if c_prev.button("◀ Prev", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    c_page.caption(f"Page {len(cursors)}")
+    if c_next.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+
 # --- DIRECTORY SETUP ---
-UPLOAD_DIR = "data/input"
+# Uploads are staged outside data/input: that folder belongs to the headless worker
+# (run_pipeline.py), which would otherwise pick up a file the UI is still processing.
+UPLOAD_DIR = "data/uploads"
 ARCHIVE_DIR = "data/input_archive"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(ARCHIVE_DIR, exist_ok=True)
 
-# --- NEW HELPER: GROQ WHISPER VOICE RECOGNITION ---
-def recognize_audio(audio_bytes):
-    """
-    Sends audio bytes directly to Groq's Whisper API.
-    No local FFmpeg or conversion required.
-    """
-    try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        # Wrap the bytes in a file-like object
-        # We name it 'audio.webm' because streamlit-mic-recorder usually outputs WebM
-        audio_file = BytesIO(audio_bytes)
-        audio_file.name = "audio.webm" 
-        
-        transcription = client.audio.transcriptions.create(
-            file=audio_file,
-            model="whisper-large-v3", # Best model for Multilingual/Hinglish
-            response_format="text",
-            language="en" # Optional: You can remove this to let it auto-detect Hindi/English mixed
-        )
-        return transcription
-        
-    except Exception as e:
-        return f"Voice Error: {e}"
-
 # --- SIDEBAR: SYSTEM CONTROLS ---
 st.sidebar.header("🛠️ System Controls")
 st.session_state.show_chat = st.sidebar.toggle("💬 Enable AI Assistant", value=st.session_state.show_chat)
 
 if st.sidebar.button("🗑️ Clear Cache"):
     st.cache_data.clear()
+    data_cache.clear()
     st.session_state.chat_history = [] 
     st.sidebar.warning("Cache & Chat cleared.")
 
+cache = extraction_cache.cache_stats()
+st.sidebar.caption(f"♻️ Extraction cache: {cache['hits']} hits / {cache['misses']} misses · {cache['entries']} stored")
+views = data_cache.cache_stats()
+st.sidebar.caption(f"⚡ View cache: {views['hits']} hits / {views['misses']} misses · ledger v{views['version']}")
+
 # --- LAYOUT MANAGEMENT ---
 if st.session_state.show_chat:
     col_dashboard, col_chat = st.columns([3, 1]) 
@@ -83,72 +112,75 @@ else:
 with col_dashboard:
     st.title("🛡️ AI Financial Intelligence Engine")
     
-    tabs = st.tabs(["📤 Scan & Upload", "📑 Invoices", "🧾 Receipts", "🪣 Item Buckets", "📉 Merit Analysis", "📊 Analytics"])
-    tab_scan, tab_inv, tab_rec, tab_buckets, tab_merit, tab_charts = tabs
-    
-    conn = get_conn()
+    # Only the selected view runs its queries (st.tabs would build all six on every rerun)
+    view = st.radio("View", ["📤 Scan & Upload", "📑 Invoices", "🧾 Receipts", "🪣 Item Buckets", "📉 Merit Analysis", "📊 Analytics", "⏱️ Performance"],
+                    horizontal=True, label_visibility="collapsed", key="view")
 
     # --- TAB 1: SCAN ---
-    with tab_scan:
+    if view == "📤 Scan & Upload":
         st.subheader("AI Document Scanner")
         uploaded_files = st.file_uploader("Drag & Drop Documents", type=['png', 'jpg', 'jpeg', 'pdf'], accept_multiple_files=True)
         
+        batch_mode = st.checkbox("📚 Batch small receipts (several scans per AI call)", value=False)
+
         if uploaded_files and st.button("🚀 Process Files"):
             progress = st.progress(0)
             status = st.empty()
-            for i, f in enumerate(uploaded_files):
+            paths = []
+            for f in uploaded_files:
                 path = os.path.join(UPLOAD_DIR, f.name)
                 with open(path, "wb") as buffer: buffer.write(f.getbuffer())
-                
-                with st.spinner(f"Analyzing {f.name}..."):
+                paths.append(path)
+
+            # Files are extracted concurrently; results stream back as each one is committed
+            status.info(f"Analyzing {len(paths)} file(s)...")
+            for i, result in enumerate(ingest_files(paths, batch_size=BATCH_SIZE if batch_mode else 1)):
+                name = os.path.basename(result["path"])
+                if result["ok"]:
                     try:
-                        process_scanned_document(path)
-                        shutil.move(path, os.path.join(ARCHIVE_DIR, f.name))
-                        st.success(f"✅ Saved: {f.name}")
-                    except Exception as e:
-                        st.error(f"❌ Error: {e}")
-                
-                time.sleep(1) 
-                progress.progress((i+1)/len(uploaded_files))
+                        shutil.move(result["path"], os.path.join(ARCHIVE_DIR, name))
+                    except OSError as e:
+                        st.warning(f"⚠️ Could not archive {name}: {e}")
+                    st.success(f"✅ Saved: {name}")
+                else:
+                    st.error(f"❌ Error ({name}): {result['error']}")
+                progress.progress((i+1)/len(paths))
             st.rerun()
 
-    # --- TAB 2: INVOICES ---
-    with tab_inv:
-        c1, c2 = st.columns(2)
-        with c1:
-            st.write("**Invoices Received**")
-            st.dataframe(pd.read_sql_query("SELECT id, date, total, status FROM inv_rec", conn).style.map(get_status_style, subset=['status']), use_container_width=True)
-        with c2:
-            st.write("**Invoices Sent**")
-            st.dataframe(pd.read_sql_query("SELECT id, date, total, status FROM inv_sent", conn).style.map(get_status_style, subset=['status']), use_container_width=True)
-
-    # --- TAB 3: RECEIPTS ---
-    with tab_rec:
-        c3, c4 = st.columns(2)
-        with c3:
-            st.write("**Receipts Received**")
-            st.dataframe(pd.read_sql_query("SELECT id, inv_id, date, amount, status FROM rec_rec", conn).style.map(get_status_style, subset=['status']), use_container_width=True)
-        with c4:
-            st.write("**Receipts Sent**")
-            st.dataframe(pd.read_sql_query("SELECT id, inv_id, date, amount, status FROM rec_sent", conn).style.map(get_status_style, subset=['status']), use_container_width=True)
+    # --- TAB 2 / 3: INVOICES & RECEIPTS ---
+    elif view in ("📑 Invoices", "🧾 Receipts"):
+        filters = audit_filters(view)
+        left, right = st.columns(2)
+        if view == "📑 Invoices":
+            with left: paged_table("Invoices Received", "inv_rec", lambda **kw: lq.audit_page("inv_rec", **kw), **filters)
+            with right: paged_table("Invoices Sent", "inv_sent", lambda **kw: lq.audit_page("inv_sent", **kw), **filters)
+        else:
+            with left: paged_table("Receipts Received", "rec_rec", lambda **kw: lq.audit_page("rec_rec", **kw), **filters)
+            with right: paged_table("Receipts Sent", "rec_sent", lambda **kw: lq.audit_page("rec_sent", **kw), **filters)
 
     # --- TAB 4: BUCKETS ---
-    with tab_buckets:
-        bucket = st.selectbox("Select Tracker:", ["payment_to_be_received_inv", "payment_received_rec", "payment_to_be_sent_inv", "payment_to_be_done_rec"])
-        st.dataframe(pd.read_sql_query(f"SELECT parent_id, item_name, qty_total, qty_fulfilled, status FROM {bucket}", conn).style.map(get_status_style, subset=['status']), use_container_width=True)
+    elif view == "🪣 Item Buckets":
+        c_b1, c_b2, c_b3 = st.columns([2, 1, 1])
+        bucket = c_b1.selectbox("Select Tracker:", ["payment_to_be_received_inv", "payment_received_rec", "payment_to_be_sent_inv", "payment_to_be_done_rec"])
+        b_status = c_b2.selectbox("Status", STATUS_OPTIONS, key="bucket_status")
+        b_parent = c_b3.text_input("Parent document", key="bucket_parent").strip()
+        paged_table(bucket, f"bucket_{bucket}", lambda **kw: lq.bucket_page(bucket, **kw),
+                    status=b_status or None, parent_id=b_parent or None)
 
     # --- TAB 5: MERIT ---
-    with tab_merit:
+    elif view == "📉 Merit Analysis":
         c_m1, c_m2 = st.columns([1, 2])
         with c_m1:
             st.write("**Master Scores**")
-            st.table(pd.read_sql_query("SELECT name, merit, streak FROM entity_master", conn))
+            st.dataframe(lq.entity_scores(), use_container_width=True, hide_index=True)
         with c_m2:
-            st.write("**Audit Trail**")
-            st.dataframe(pd.read_sql_query("SELECT e.name, t.change, t.reason, t.timestamp FROM merit_audit_trail t JOIN entity_master e ON t.entity_id = e.id ORDER BY t.timestamp DESC", conn), use_container_width=True)
+            entities = lq.entity_options()
+            who = st.selectbox("Entity", ["All"] + list(entities), key="merit_entity")
+            paged_table("Audit Trail", "merit_trail", lq.merit_trail_page, entity_id=entities.get(who))
 
     # --- TAB 6: ANALYTICS ---
-    with tab_charts:
+    elif view == "📊 Analytics":
+        import src.viz_engine as viz
         c_g1, c_g2 = st.columns(2)
         with c_g1:
             f_chart = viz.get_fulfillment_chart()
@@ -162,12 +194,37 @@ with col_dashboard:
         m_chart = viz.get_merit_trend_chart()
         if m_chart: st.plotly_chart(m_chart, use_container_width=True)
 
-    conn.close()
+        st.subheader("🧾 Top Items by Amount")
+        docs = st.selectbox("Documents", ["Receipts", "Invoices"], key="item_totals_docs")
+        totals = lq.item_totals(("rec_rec", "rec_sent") if docs == "Receipts" else ("inv_rec", "inv_sent"))
+        if totals.empty: st.info("No line items yet.")
+        else: st.dataframe(totals, use_container_width=True, hide_index=True)
+
+    # --- TAB 7: PERFORMANCE ---
+    elif view == "⏱️ Performance":
+        hours = st.selectbox("Window", [1, 24, 168], index=1, format_func=lambda h: f"Last {h} h", key="perf_hours")
+        summary = telemetry.stage_summary(hours)
+        if summary.empty:
+            st.info("No timings recorded yet.")
+        else:
+            st.write("**Stage latency (ms)**")
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            stage = st.selectbox("Trend for stage", summary["stage"], key="perf_stage")
+            trend = telemetry.stage_trend(stage, hours)
+            if not trend.empty: st.line_chart(trend)
+
+        counters = telemetry.counter_totals(hours)
+        if counters:
+            st.write("**Counters**")
+            st.dataframe([{"counter": name, "total": total} for name, total in counters.items()], use_container_width=True, hide_index=True)
 
 # =========================================================
 #  SECTION 2: THE CHATBOT WITH VOICE (Inside col_chat)
 # =========================================================
 if col_chat:
+    from streamlit_mic_recorder import mic_recorder
+    from src.bot_engine import stream_financial_bot, transcribe_audio
+
     with col_chat:
         st.subheader("💬 Assistant")
         
@@ -176,9 +233,11 @@ if col_chat:
         audio = mic_recorder(start_prompt="🎤 Speak", stop_prompt="⏹️ Stop", key='recorder')
         
         voice_text = None
-        if audio:
+        # The recorder keeps returning the last clip on every rerun; transcribe each clip once
+        if audio and audio.get('id') != st.session_state.get("last_audio_id"):
+            st.session_state.last_audio_id = audio.get('id')
             with st.spinner("Transcribing..."):
-                voice_text = recognize_audio(audio['bytes'])
+                voice_text = transcribe_audio(audio['bytes'])
         
         # 2. CHAT HISTORY DISPLAY
         chat_container = st.container(height=500)
@@ -189,7 +248,7 @@ if col_chat:
 
         # 3. INPUT HANDLING
         prompt = st.chat_input("Type or use 🎤 above...")
-        
+
         if voice_text and not prompt:
             prompt = voice_text
             st.info(f"🗣️ Heard: {prompt}")
@@ -202,8 +261,10 @@ if col_chat:
 
             with chat_container:
                 with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        response = ask_financial_bot(prompt, st.session_state.chat_history)
-                        st.markdown(response)
+                    # Tokens are rendered as they arrive; write_stream returns the full text
+                    response = st.write_stream(stream_financial_bot(prompt, st.session_state.chat_history))
             
-            st.session_state.chat_history.append({"role": "assistant", "content": response})
\ No newline at end of file
+            st.session_state.chat_history.append({"role": "assistant", "content": response})
+
+# Whole-script timing (reruns cut short by st.rerun() are not counted)
+telemetry.record("streamlit.rerun", (time.perf_counter() - rerun_started) * 1000)
@@ -1,24 +1,121 @@
 import os
 import sys
 import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_PATH)
-sys.path.insert(0, os.path.join(BASE_PATH, "src"))
+# Ledger, caches and data/ are relative to backend/ (same as `streamlit run main.py`)
+os.chdir(BASE_PATH)
 
 try:
-    from image_processor import run_processor
-    from database_sync import process_sync_pipeline
+    from src.migrations import run_migrations
+    from src.extractor import analyze_document
+    from src.ingestion import INGEST_WORKERS
+    from src import job_queue
 except ImportError as e:
     print(f"❌ Critical Import Error: {e}")
     sys.exit(1)
 
+# The worker's inbox. The Streamlit scanner stages its uploads in data/uploads, so a
+# file is never extracted by both; both archive to the same folder.
+INPUT_DIR = "data/input"
+ARCHIVE_DIR = "data/input_archive"
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".pdf")
+SETTLE_SECONDS = 2  # skip files modified this recently (still being copied in)
+
+
+def archive(path):
+    try:
+        shutil.move(path, os.path.join(ARCHIVE_DIR, os.path.basename(path)))
+    except OSError as e:
+        print(f"⚠️ Could not archive {path}: {e}")
+
+
+def scan_inbox():
+    """Queues new files in INPUT_DIR; archives files whose content is already committed."""
+    now = time.time()
+    for name in sorted(os.listdir(INPUT_DIR)):
+        path = os.path.join(INPUT_DIR, name)
+        if not name.lower().endswith(EXTENSIONS) or not os.path.isfile(path):
+            continue
+        if now - os.path.getmtime(path) < SETTLE_SECONDS:
+            continue
+        job = job_queue.enqueue(path)
+        if job["state"] == "committed":
+            # Duplicate upload, or we crashed between the commit and the move
+            print(f"♻️ Already in the ledger: {name}")
+            archive(path)
+
+
+def extract_job(job):
+    """Worker thread: model call only, under a heartbeat lease. Never touches the ledger tables."""
+    try:
+        with job_queue.keep_alive(job["id"]):
+            result = analyze_document(job["path"])
+        if not result:
+            raise ValueError("AI extraction returned no data")
+        job_queue.mark_extracted(job, result)
+        print(f"🔍 Extracted: {os.path.basename(job['path'])}")
+    except Exception as e:
+        state = job_queue.mark_failed(job, e, worker_id=job["lease_owner"])
+        print(f"❌ Extraction Error ({job['path']}, attempt {job['attempts']}, now {state}): {e}")
+
+
+def run(workers, poll_seconds, once):
+    os.makedirs(INPUT_DIR, exist_ok=True)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    run_migrations()
+
+    print(f"🚀 Pipeline worker {job_queue.WORKER_ID} watching {INPUT_DIR} ({workers} extractors)")
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+    running = set()
+    try:
+        while True:
+            scan_inbox()
+
+            # 1. Keep the extractors busy (expired leases of dead workers are picked up too)
+            running = {f for f in running if not f.done()}
+            while len(running) < workers:
+                job = job_queue.claim()
+                if not job:
+                    break
+                running.add(pool.submit(extract_job, job))
+
+            # 2. Single writer: this thread is the only one booking documents
+            for job in job_queue.commit_extracted():
+                print(f"✅ Saved: {os.path.basename(job['path'])}")
+                archive(job["path"])
+
+            if once and not running and not job_queue.pending():
+                break
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("🛑 Stopping...")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        released = job_queue.release()
+        if released:
+            print(f"↩️ Returned {released} in-flight job(s) to the queue")
+
+    print(f"✨ Process Complete. Jobs: {job_queue.counts()}")
+
+
 def main():
-    print("🚀 Starting Financial Audit Pipeline...")
-    run_processor()
-    print("🔄 Running Typo Sentinel & DB Sync...")
-    process_sync_pipeline()
-    print("✨ Process Complete.")
+    parser = argparse.ArgumentParser(description="Headless ingestion worker for data/input.")
+    parser.add_argument("--once", action="store_true", help="drain the inbox and exit instead of watching it")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="concurrent extractions")
+    parser.add_argument("--poll", type=float, default=5.0, help="seconds between inbox scans")
+    parser.add_argument("--retry-failed", action="store_true", help="re-queue jobs that used up their attempts")
+    args = parser.parse_args()
+
+    if args.retry_failed:
+        run_migrations()
+        print(f"🔁 Re-queued {job_queue.requeue_failed()} failed job(s)")
+    run(args.workers, args.poll, args.once)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,73 +1,172 @@
-from src.database_manager import get_conn
+from collections import defaultdict, deque
+from src.database_manager import transaction, chunked
+from src import fuzzy_match
+from src import telemetry
 from datetime import datetime  # ADDED THIS IMPORT
 
 def update_parent_status(parent_id, audit_table, bucket_table):
     """
     Checks if all child items are 'Completed' to update the parent header status.
     """
-    conn = get_conn()
-    cursor = conn.cursor()
-    
-    cursor.execute(f"SELECT COUNT(*) FROM {bucket_table} WHERE parent_id = ? AND status != 'Completed'", (parent_id,))
-    remaining_items = cursor.fetchone()[0]
-    
-    new_status = "Completed" if remaining_items == 0 else "Partial"
-    
-    cursor.execute(f"UPDATE {audit_table} SET status = ? WHERE id = ?", (new_status, parent_id))
-    
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(f"SELECT COUNT(*) FROM {bucket_table} WHERE parent_id = ? AND status != 'Completed'", (parent_id,))
+        remaining_items = cursor.fetchone()[0]
+
+        new_status = "Completed" if remaining_items == 0 else "Partial"
+
+        cursor.execute(f"UPDATE {audit_table} SET status = ? WHERE id = ?", (new_status, parent_id))
     return new_status
 
-def reconcile_with_payment(item_name, qty_received, unit_price, parent_id):
+@telemetry.timed("analyzer.update_parent_statuses")
+def update_parent_statuses(parent_ids, audit_table, bucket_table):
+    """Set-based roll-up: re-derives the header status of many parents (one statement per chunk of ids)."""
+    parent_ids = list(parent_ids)
+    if not parent_ids:
+        return
+    with transaction() as conn:
+        for chunk in chunked(parent_ids):
+            conn.execute(f"""
+                UPDATE {audit_table}
+                SET status = CASE
+                    WHEN EXISTS (
+                        SELECT 1 FROM {bucket_table} b
+                        WHERE b.parent_id = {audit_table}.id AND b.status != 'Completed'
+                    ) THEN 'Partial'
+                    ELSE 'Completed'
+                END
+                WHERE id IN ({",".join("?" * len(chunk))})
+            """, chunk)
+
+def _load_open_buckets(cursor, item_names):
+    """All open invoice lines for the given items, oldest first, grouped by item."""
+    open_buckets = defaultdict(deque)
+    for chunk in chunked(item_names):
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"""
+            SELECT item_id, parent_id, item_name, qty_total, qty_fulfilled
+            FROM payment_to_be_received_inv
+            WHERE item_name IN ({placeholders}) AND status != 'Completed'
+            ORDER BY item_id ASC
+        """, chunk)
+        for item_id, invoice_id, item_name, total, fulfilled in cursor.fetchall():
+            # [item_id, invoice_id, qty_total, qty_fulfilled] - mutated while allocating
+            open_buckets[item_name].append([item_id, invoice_id, total or 0, fulfilled or 0])
+    return open_buckets
+
+@telemetry.timed("analyzer.reconcile_receipt")
+def reconcile_receipt(receipt_id, items, receipt_date=None):
     """
-    Matches received items against open Invoices and updates the ledger.
+    Batch reconciliation of a whole receipt against open Invoice buckets.
+    Every line is matched FIFO in memory (one SELECT for all items); a quantity
+    larger than the oldest open line spills over into the next invoices.
+    Lines with no exact match fall back to fuzzy_match (audited in fuzzy_match_audit).
+    Writes go out with executemany and the parent roll-up is one set-based UPDATE.
+    Returns {"invoices": [...], "orphans": [(item_name, qty), ...]}.
     """
-    conn = get_conn()
-    cursor = conn.cursor()
-    
-    # --- PART A: FIND THE TARGET INVOICE BUCKET ---
-    cursor.execute("""
-        SELECT item_id, parent_id, qty_total, qty_fulfilled 
-        FROM payment_to_be_received_inv 
-        WHERE item_name = ? AND status != 'Completed'
-        ORDER BY item_id ASC LIMIT 1
-    """, (item_name,))
-    
-    row = cursor.fetchone()
-    if row:
-        item_id, invoice_id, total, fulfilled = row
-        new_fulfilled = fulfilled + qty_received
-        item_status = "Completed" if new_fulfilled >= total else "Partial"
-        
-        # --- FIXED: DYNAMIC DATE ---
-        current_date_str = datetime.now().strftime("%Y-%m-%d")
+    receipt_date = receipt_date or datetime.now().strftime("%Y-%m-%d")
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # --- PART A: FIND THE TARGET INVOICE BUCKETS (one query) ---
+        open_buckets = _load_open_buckets(cursor, {item.get('name') for item in items})
+
+        bucket_updates = {}      # item_id -> (new_fulfilled, status)
+        received_rows = []
+        touched_invoices = []
+        orphans = []
+        fuzzy_matches = []
+        amount = 0.0
+
+        def allocate(queue, qty_left):
+            """FIFO over one item's open lines; returns the quantity taken."""
+            taken = 0
+            while qty_left > taken and queue:
+                bucket = queue[0]
+                item_id, invoice_id, total, fulfilled = bucket
+                take = min(qty_left - taken, max(total - fulfilled, 0))
+                bucket[3] = fulfilled + take
+                taken += take
+
+                if bucket[3] >= total:
+                    queue.popleft()
+                    bucket_updates[item_id] = (bucket[3], "Completed")
+                else:
+                    bucket_updates[item_id] = (bucket[3], "Partial")
+                if invoice_id not in touched_invoices:
+                    touched_invoices.append(invoice_id)
+            return taken
+
+        for item in items:
+            item_name = item.get('name')
+            qty_left = item.get('qty') or 0
+            unit_price = item.get('price') or 0
+
+            matched = allocate(open_buckets.get(item_name), qty_left)
+            qty_left -= matched
+            if matched:
+                received_rows.append((receipt_id, item_name, matched, matched, unit_price, 'Completed'))
+                amount += matched * unit_price
+                print(f"✅ Reconciled {matched} units of {item_name}")
+
+            # OCR variants of the name ("A4 Paper 500s" vs "A4 paper (500)") before giving up
+            if qty_left > 0 and item_name:
+                for candidate, score in fuzzy_match.find_candidates(cursor, item_name):
+                    if candidate not in open_buckets:
+                        open_buckets.update(_load_open_buckets(cursor, [candidate]))
+                        if not open_buckets.get(candidate):
+                            # Settled since it was indexed
+                            fuzzy_match.forget(candidate)
+                            continue
+                    taken = allocate(open_buckets[candidate], qty_left)
+                    if taken:
+                        qty_left -= taken
+                        received_rows.append((receipt_id, candidate, taken, taken, unit_price, 'Completed'))
+                        fuzzy_matches.append((item_name, candidate, score, taken))
+                        amount += taken * unit_price
+                        print(f"🔎 Reconciled {taken} units of {item_name} as '{candidate}' (similarity {score})")
+                    if qty_left <= 0:
+                        break
+
+            if qty_left > 0:
+                print(f"⚠️ No open invoice found for {qty_left} x {item_name}. Recording as orphan payment.")
+                orphans.append((item_name, qty_left))
+
+        if not touched_invoices:
+            return {"invoices": [], "orphans": orphans}
 
         # --- PART B: MIRROR TO AUDIT LEDGER (Layer 1) ---
         cursor.execute("""
             INSERT OR IGNORE INTO rec_sent (id, inv_id, date, amount, status)
             VALUES (?, ?, ?, ?, ?)
-        """, (parent_id, invoice_id, current_date_str, (qty_received * unit_price), 'Completed'))
+        """, (receipt_id, touched_invoices[0], receipt_date, amount, 'Completed'))
+        # The scanned receipt header may already exist without its invoice link
+        cursor.execute("UPDATE rec_sent SET inv_id = COALESCE(inv_id, ?) WHERE id = ?", (touched_invoices[0], receipt_id))
 
         # --- PART C: UPDATE ITEM BUCKETS (Layer 2) ---
-        cursor.execute("""
-            UPDATE payment_to_be_received_inv 
-            SET qty_fulfilled = ?, status = ? 
+        cursor.executemany("""
+            UPDATE payment_to_be_received_inv
+            SET qty_fulfilled = ?, status = ?
             WHERE item_id = ?
-        """, (new_fulfilled, item_status, item_id))
+        """, [(fulfilled, status, item_id) for item_id, (fulfilled, status) in bucket_updates.items()])
 
-        cursor.execute("""
+        cursor.executemany("""
             INSERT INTO payment_received_rec (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (parent_id, item_name, qty_received, qty_received, unit_price, 'Completed'))
-        
-        conn.commit()
-        conn.close()
-
-        # --- PART D: PARENT STATUS ROLL-UP ---
-        update_parent_status(invoice_id, "inv_sent", "payment_to_be_received_inv")
-        
-        print(f"✅ Reconciled {qty_received} units of {item_name} for {invoice_id}. Status: {item_status}")
-    else:
-        print(f"⚠️ No open invoice found for item: {item_name}. Recording as orphan payment.")
-        conn.close()
\ No newline at end of file
+        """, received_rows)
+
+        fuzzy_match.record_matches(cursor, receipt_id, fuzzy_matches)
+
+        # --- PART D: PARENT STATUS ROLL-UP (one statement for all invoices) ---
+        update_parent_statuses(touched_invoices, "inv_sent", "payment_to_be_received_inv")
+
+    return {"invoices": touched_invoices, "orphans": orphans}
+
+def reconcile_with_payment(item_name, qty_received, unit_price, parent_id):
+    """
+    Matches received items against open Invoices and updates the ledger.
+    Single-line convenience wrapper around reconcile_receipt().
+    """
+    return reconcile_receipt(parent_id, [{"name": item_name, "qty": qty_received, "price": unit_price}])
@@ -1,82 +1,317 @@
 import os
+import re
+import json
 import time
-from groq import Groq
+import threading
+from io import BytesIO
 from dotenv import load_dotenv
 from src.database_manager import get_conn
 from src.market_watcher import get_inflation_rate
+from src.sql_engine import run_query_json, MAX_ROWS
+from src import telemetry
+from src import clients
 
 load_dotenv()
 
-# Initialize Groq Client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# The Groq client (shared by chat and voice) is built on first use - see clients.py
+
+CHAT_MODEL = "llama-3.3-70b-versatile"
+MAX_TOOL_ROUNDS = 4
+
+# Lets the model answer from real aggregates instead of guessing from the schema
+SQL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "run_sql",
+        "description": f"Run ONE read-only SQLite SELECT against the ledger and get the rows back as JSON (max {MAX_ROWS} rows). Aggregate in SQL (SUM/COUNT/GROUP BY) rather than fetching raw rows.",
+        "parameters": {
+            "type": "object",
+            "properties": {"sql": {"type": "string", "description": "A single SELECT or WITH query."}},
+            "required": ["sql"],
+        },
+    },
+}
+
+CODE_FILES = ['src/merit_logic.py', 'src/analyzer.py', 'src/logic_gate.py']
+HISTORY_TOKEN_BUDGET = int(os.getenv("BOT_HISTORY_TOKENS", "2000"))
+MAX_RELEVANT_TABLES = 4
+
+# Question words -> tables they usually mean (table names themselves also match)
+TABLE_HINTS = {
+    "invoice": ["inv_rec", "inv_sent"],
+    "bill": ["inv_rec", "inv_sent"],
+    "receipt": ["rec_rec", "rec_sent"],
+    "payment": ["rec_rec", "rec_sent", "payment_received_rec"],
+    "owe": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "owed": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "debt": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "due": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "outstanding": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "pending": ["payment_to_be_received_inv", "payment_to_be_sent_inv"],
+    "bucket": ["payment_to_be_received_inv", "payment_received_rec"],
+    "item": ["payment_to_be_received_inv", "item_fulfillment_summary", "document_items"],
+    "line": ["document_items"],
+    "fulfil": ["item_fulfillment_summary", "payment_to_be_received_inv"],
+    "vendor": ["entity_master"],
+    "client": ["entity_master"],
+    "supplier": ["entity_master"],
+    "merit": ["entity_master", "merit_audit_trail"],
+    "score": ["entity_master", "merit_audit_trail"],
+    "streak": ["entity_master", "merit_audit_trail"],
+    "penalty": ["merit_audit_trail"],
+    "price": ["market_index", "vendor_item_prices"],
+    "market": ["market_index"],
+}
+
+# --- PRECOMPUTED CONTEXT (rebuilt only when the schema or the source files change) ---
+_context = {"key": None, "tables": {}, "columns": {}, "catalog": "", "code": ""}
+_context_lock = threading.Lock()
+
+def _context_key():
+    schema_version = get_conn().execute("PRAGMA schema_version").fetchone()[0]
+    mtimes = tuple(os.path.getmtime(f) if os.path.exists(f) else 0 for f in CODE_FILES)
+    return schema_version, mtimes
 
 def get_db_schema():
-    """Reads the database structure."""
+    """Reads the database structure as {table_name: CREATE statement}."""
     conn = get_conn()
     cursor = conn.cursor()
-    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table';")
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
     tables = cursor.fetchall()
     conn.close()
-    return "\n".join([t[0] for t in tables if t[0] is not None])
+    return {name: sql for name, sql in tables if sql is not None}
 
 def get_code_context():
     """Reads key logic files."""
-    files_to_read = ['src/merit_logic.py', 'src/analyzer.py', 'src/logic_gate.py']
     context = ""
-    for fname in files_to_read:
+    for fname in CODE_FILES:
         if os.path.exists(fname):
             with open(fname, 'r', encoding='utf-8') as f:
                 context += f"\n--- {fname} ---\n{f.read()}\n"
     return context
 
-def ask_financial_bot(user_query, chat_history):
-    """
-    Master Bot Function using Groq (Llama 3.3).
-    """
-    try:
-        # 1. GATHER CONTEXT
-        schema = get_db_schema()
-        code_logic = get_code_context()
-        inflation = get_inflation_rate()
-        
-        # 2. SYSTEM PROMPT
-        system_prompt = f"""
+def _table_columns(table_name):
+    return [row[1] for row in get_conn().execute(f"PRAGMA table_info({table_name})")]
+
+def get_static_context():
+    """The expensive, rarely-changing part of the prompt, cached by schema version + file mtimes."""
+    key = _context_key()
+    with _context_lock:
+        if _context["key"] != key:
+            tables = get_db_schema()
+            _context["tables"] = tables
+            _context["columns"] = {name: _table_columns(name) for name in tables}
+            # One compact line per table, always sent; full DDL only for relevant ones
+            _context["catalog"] = "\n".join(f"- {name}({', '.join(cols)})" for name, cols in _context["columns"].items())
+            _context["code"] = get_code_context()
+            _context["key"] = key
+        return _context
+
+def select_relevant_tables(user_query, columns, limit=MAX_RELEVANT_TABLES):
+    """Ranks tables ({name: [columns]}) by overlap with the question (names, columns and TABLE_HINTS)."""
+    words = set(re.findall(r"[a-z_]+", user_query.lower()))
+    scores = {}
+    for word in words:
+        for hint, hinted in TABLE_HINTS.items():
+            if word.startswith(hint):
+                for name in hinted:
+                    scores[name] = scores.get(name, 0) + 2
+    for name, cols in columns.items():
+        parts = set(name.split("_")) | {c.lower() for c in cols}
+        scores[name] = scores.get(name, 0) + len(words & parts) + (3 if name in words else 0)
+
+    ranked = sorted((n for n in columns if scores.get(n, 0) > 0), key=lambda n: -scores[n])
+    return ranked[:limit]
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def window_history(chat_history, user_query, budget=HISTORY_TOKEN_BUDGET):
+    """Keeps the most recent turns that fit the token budget (oldest are dropped first)."""
+    history = list(chat_history or [])
+    # The UI appends the current question before calling us; don't send it twice
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == user_query:
+        history.pop()
+
+    kept, used = [], 0
+    for msg in reversed(history):
+        cost = _estimate_tokens(msg["content"])
+        if used + cost > budget:
+            break
+        kept.append({"role": msg["role"], "content": msg["content"]})
+        used += cost
+    kept.reverse()
+
+    dropped = len(history) - len(kept)
+    if dropped:
+        kept.insert(0, {"role": "system", "content": f"({dropped} earlier messages omitted for length.)"})
+    return kept
+
+def build_system_prompt(user_query):
+    context = get_static_context()
+    relevant = select_relevant_tables(user_query, context["columns"])
+    schema = "\n".join(context["tables"][name] for name in relevant) or "(no table matched; see the catalog)"
+    inflation = get_inflation_rate()
+
+    return f"""
         You are the AI Financial Controller for this Micro-ERP system.
-        
+
         [YOUR KNOWLEDGE BASE]
         1. **Live Market Data**: Current Inflation Rate is {inflation}%.
-        2. **Database Schema**: 
+        2. **Table Catalog**:
+        {context["catalog"]}
+        3. **Relevant Table Definitions**:
         {schema}
-        3. **System Logic (Python Code)**:
-        {code_logic}
-        
+        4. **System Logic (Python Code)**:
+        {context["code"]}
+
         [YOUR CAPABILITIES]
         - Analyze the DB schema to answer questions about debts/invoices.
         - Explain the 'Merit System' (Fibonacci penalties).
         - Check fair pricing using inflation rates.
+        - Use the `run_sql` tool to get real numbers (totals, balances, counts) before answering.
         - Generate SQL queries for SQLite if asked.
-        
+
         Answer concisely and professionally.
         """
-        
-        # 3. PREPARE MESSAGES
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add history (Groq format)
-        if chat_history:
-            for msg in chat_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Add current query
-        messages.append({"role": "user", "content": user_query})
-
-        # 4. CALL GROQ (UPDATED MODEL NAME HERE)
-        response = client.chat.completions.create(
-            messages=messages,
-            model="llama-3.3-70b-versatile", # <--- CHANGED THIS
+
+@telemetry.timed("bot_engine.build_messages")
+def build_messages(user_query, chat_history):
+    # 1. GATHER CONTEXT + 2. SYSTEM PROMPT (static parts are cached)
+    system_prompt = build_system_prompt(user_query)
+
+    # 3. PREPARE MESSAGES
+    messages = [{"role": "system", "content": system_prompt}]
+
+    # Add history (Groq format), windowed to the token budget
+    messages.extend(window_history(chat_history, user_query))
+
+    # Add current query
+    messages.append({"role": "user", "content": user_query})
+    return messages
+
+@telemetry.timed("bot_engine.run_tool")
+def _run_tool_call(call_id, name, arguments):
+    """Executes one tool call and returns the 'tool' message for the conversation."""
+    if name == "run_sql":
+        try:
+            sql = json.loads(arguments or "{}").get("sql", "")
+        except json.JSONDecodeError:
+            sql = ""
+        content = run_query_json(sql) if sql else json.dumps({"error": "Missing 'sql' argument."})
+    else:
+        content = json.dumps({"error": f"Unknown tool: {name}"})
+    return {"role": "tool", "tool_call_id": call_id, "content": content}
+
+def _assistant_tool_message(content, tool_calls):
+    return {
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [
+            {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+            for c in tool_calls
+        ],
+    }
+
+def ask_financial_bot(user_query, chat_history):
+    """
+    Master Bot Function using Groq (Llama 3.3).
+    Tool loop: the model may call run_sql a few times before it answers.
+    """
+    try:
+        messages = build_messages(user_query, chat_history)
+
+        for _ in range(MAX_TOOL_ROUNDS + 1):
+            # 4. CALL GROQ (UPDATED MODEL NAME HERE)
+            telemetry.incr("chat_calls")
+            with telemetry.span("bot_engine.chat_completion"):
+                response = clients.groq().chat.completions.create(
+                    messages=messages,
+                    model=CHAT_MODEL,
+                    tools=[SQL_TOOL],
+                )
+            message = response.choices[0].message
+            if not message.tool_calls:
+                return message.content
+
+            calls = [{"id": c.id, "name": c.function.name, "arguments": c.function.arguments} for c in message.tool_calls]
+            messages.append(_assistant_tool_message(message.content, calls))
+            messages.extend(_run_tool_call(c["id"], c["name"], c["arguments"]) for c in calls)
+
+        return "❌ Too many tool calls without an answer."
+
+    except Exception as e:
+        return f"❌ Groq Error: {e}"
+
+def stream_financial_bot(user_query, chat_history):
+    """
+    Same as ask_financial_bot() but yields the answer token by token
+    (feed it to st.write_stream) so the first words show up immediately.
+    Tool-call deltas are accumulated, executed, and the stream resumes.
+    """
+    try:
+        messages = build_messages(user_query, chat_history)
+
+        for _ in range(MAX_TOOL_ROUNDS + 1):
+            telemetry.incr("chat_calls")
+            started = time.perf_counter()
+            stream = clients.groq().chat.completions.create(
+                messages=messages,
+                model=CHAT_MODEL,
+                tools=[SQL_TOOL],
+                stream=True,
+            )
+            content, calls = "", {}
+            for chunk in stream:
+                if started:
+                    # Time to first token is what the user waits for
+                    telemetry.record("bot_engine.first_token", (time.perf_counter() - started) * 1000)
+                    started = None
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content += delta.content
+                    yield delta.content
+                for tc in delta.tool_calls or []:
+                    call = calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                    call["id"] = tc.id or call["id"]
+                    if tc.function and tc.function.name:
+                        call["name"] = tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["arguments"] += tc.function.arguments
+
+            if not calls:
+                return
+
+            calls = [calls[i] for i in sorted(calls)]
+            messages.append(_assistant_tool_message(content, calls))
+            messages.extend(_run_tool_call(c["id"], c["name"], c["arguments"]) for c in calls)
+
+        yield "❌ Too many tool calls without an answer."
+
+    except Exception as e:
+        yield f"❌ Groq Error: {e}"
+
+@telemetry.timed("bot_engine.transcribe_audio")
+def transcribe_audio(audio_bytes):
+    """
+    Sends audio bytes directly to Groq's Whisper API (shared client).
+    No local FFmpeg or conversion required.
+    """
+    try:
+        # Wrap the bytes in a file-like object
+        # We name it 'audio.webm' because streamlit-mic-recorder usually outputs WebM
+        audio_file = BytesIO(audio_bytes)
+        audio_file.name = "audio.webm"
+
+        transcription = clients.groq().audio.transcriptions.create(
+            file=audio_file,
+            model="whisper-large-v3", # Best model for Multilingual/Hinglish
+            response_format="text",
+            language="en" # Optional: You can remove this to let it auto-detect Hindi/English mixed
         )
-        
-        return response.choices[0].message.content
+        return transcription
 
     except Exception as e:
-        return f"❌ Groq Error: {e}"
\ No newline at end of file
+        return f"Voice Error: {e}"
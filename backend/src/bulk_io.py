@@ -0,0 +1,416 @@
+import os
+import csv
+import sqlite3
+from collections import defaultdict
+from datetime import datetime
+from src.database_manager import transaction, get_conn, chunked
+from src.doc_schema import DOC_TYPES, coerce_document, validate_document
+from src.migrations import AUDIT_ENTITY_COLUMNS
+from src.merit_engine import apply_scan_outcomes
+from src.logic_gate import record_price_history
+from src import telemetry
+
+# Bulk import / export of whole ledgers (migrating history from another system,
+# feeding reporting tools) without scanning documents one by one.
+#
+# File layout, CSV or Parquet: ONE ROW PER DOCUMENT LINE, the lines of a document
+# next to each other (a document whose lines are split up is rejected as a whole). Header fields repeat on every line of the document; a
+# document without items is a single row with an empty item_name.
+#     id, type, vendor_name, date, total, status, inv_id, confidence_score,
+#     item_name, qty, price, qty_fulfilled
+# Only id, type and item_name are required; `client_name` is accepted for vendor_name.
+# Every document is checked against the same contract as an extraction
+# (doc_schema) before it may touch the ledger.
+#
+# Files are streamed in chunks of BATCH_ROWS lines and each batch is loaded with
+# executemany in one transaction, so memory stays flat and an interrupted import
+# can simply be run again (documents already in the ledger are skipped).
+
+BATCH_ROWS = 50_000
+MAX_REPORTED_ERRORS = 20
+
+HEADER_COLUMNS = ["id", "type", "vendor_name", "date", "total", "status", "inv_id", "confidence_score"]
+LINE_COLUMNS = ["item_name", "qty", "price", "qty_fulfilled"]
+COLUMNS = HEADER_COLUMNS + LINE_COLUMNS
+STATUSES = ("Incomplete", "Partial", "Completed")
+INVOICE_BUCKETS = {"inv_rec": "payment_to_be_sent_inv", "inv_sent": "payment_to_be_received_inv"}
+
+
+def _parquet():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet files need the 'pyarrow' package (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+# --- READING ---
+
+def read_chunks(path, chunk_rows=BATCH_ROWS):
+    """Yields lists of row tuples (in COLUMNS order) of at most `chunk_rows` lines."""
+    import pandas as pd
+
+    if _is_parquet(path):
+        _, pq = _parquet()
+        frames = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+    else:
+        # Everything as text: ids like '0042' stay intact, numbers are coerced per document
+        frames = pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False, na_values=[""])
+
+    for df in frames:
+        if "vendor_name" not in df.columns and "client_name" in df.columns:
+            df = df.rename(columns={"client_name": "vendor_name"})
+        missing = {"id", "type", "item_name"} - set(df.columns)
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(sorted(missing))}")
+        df = df.reindex(columns=COLUMNS).astype(object)
+        yield list(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def iter_documents(chunks):
+    """Groups consecutive lines of the same (type, id) into extraction-style dicts. A document may span chunks."""
+    doc, key = None, None
+    for rows in chunks:
+        for doc_id, doc_type, vendor, date, total, status, inv_id, confidence, name, qty, price, fulfilled in rows:
+            if (doc_type, doc_id) != key:
+                if doc is not None:
+                    yield doc
+                key = (doc_type, doc_id)
+                if hasattr(date, "strftime"):
+                    date = date.strftime("%Y-%m-%d")  # Parquet date / timestamp columns
+                doc = {"id": None if doc_id is None else str(doc_id), "type": doc_type, "vendor_name": vendor,
+                       "date": date, "total": total, "status": status, "inv_id": inv_id,
+                       "confidence_score": confidence, "items": []}
+            if name is not None:
+                doc["items"].append({"name": str(name), "qty": qty, "price": price, "qty_fulfilled": fulfilled})
+    if doc is not None:
+        yield doc
+
+
+def split_documents(chunks):
+    """(type, id) of every document whose lines are not next to each other."""
+    seen, split, key = set(), set(), None
+    for rows in chunks:
+        for row in rows:
+            if (row[1], row[0]) != key and row[0] is not None:
+                key = (row[1], row[0])
+                if key in seen:
+                    split.add((key[0], str(key[1])))
+                seen.add(key)
+    return split
+
+
+def _number(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def check_document(doc):
+    """Coerces one imported document in place; returns its problems ([] means it may be loaded)."""
+    coerce_document(doc)
+    doc["confidence_score"] = _number(doc.get("confidence_score"))
+    for item in doc["items"]:
+        item["qty_fulfilled"] = _number(item.get("qty_fulfilled"))
+
+    errors = validate_document(doc)
+    if not doc.get("id"):
+        errors.append("id is required")
+    if doc.get("status") not in (None,) + STATUSES:
+        errors.append(f"status must be one of {', '.join(STATUSES)}")
+    for i, item in enumerate(doc["items"]):
+        if item["qty_fulfilled"] is not None and not isinstance(item["qty_fulfilled"], float):
+            errors.append(f"items[{i}].qty_fulfilled must be a number")
+    return errors
+
+
+# --- LOADING ---
+
+def _line_status(qty, fulfilled):
+    qty, fulfilled = qty or 0, fulfilled or 0
+    return "Completed" if fulfilled >= qty else "Partial" if fulfilled else "Incomplete"
+
+
+def _invoice_status(items):
+    statuses = {_line_status(item["qty"], item["qty_fulfilled"]) for item in items}
+    if statuses == {"Completed"}:
+        return "Completed"
+    return "Partial" if statuses & {"Completed", "Partial"} else "Incomplete"
+
+
+def _existing_ids(conn, docs):
+    existing = set()
+    for doc_type in DOC_TYPES:
+        ids = [doc["id"] for doc in docs if doc["type"] == doc_type]
+        for chunk in chunked(ids):
+            rows = conn.execute(f"SELECT id FROM {doc_type} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update((doc_type, doc_id) for doc_id, in rows)
+    return existing
+
+
+def _entity_ids(conn, names):
+    names = sorted(names)
+    conn.executemany("INSERT OR IGNORE INTO entity_master (name) VALUES (?)", [(name,) for name in names])
+    ids = {}
+    for chunk in chunked(names):
+        ids.update(conn.execute(f"SELECT name, id FROM entity_master WHERE name IN ({','.join('?' * len(chunk))})", chunk))
+    return ids
+
+
+def _header_sql(doc_type):
+    entity_col = AUDIT_ENTITY_COLUMNS[doc_type]
+    if doc_type in INVOICE_BUCKETS:
+        return f"INSERT INTO {doc_type} (id, {entity_col}, date, total, status) VALUES (?, ?, ?, ?, ?)"
+    return f"INSERT INTO {doc_type} (id, {entity_col}, date, amount, status, inv_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def load_batch(docs, book_merit=False, reconcile=False):
+    """
+    Writes a batch of checked documents in ONE transaction: entities, audit headers,
+    document_items, invoice bucket lines, price history and (optionally) merit and receipt settlement.
+    Returns (documents loaded, lines loaded, documents skipped as already present).
+    """
+    with telemetry.span("bulk_io.load_batch"), transaction() as conn:
+        # 1. Skip what the ledger already has (and repeats inside the file)
+        seen = _existing_ids(conn, docs)
+        new = []
+        for doc in docs:
+            key = (doc["type"], doc["id"])
+            if key not in seen:
+                seen.add(key)
+                new.append(doc)
+        if not new:
+            return 0, 0, len(docs)
+
+        for doc in new:
+            # Same fallback as commit_document()
+            doc["vendor_name"] = doc.get("vendor_name") or "Unknown Entity"
+        entity_ids = _entity_ids(conn, {doc["vendor_name"] for doc in new})
+
+        # 2. Headers + buckets, one executemany per table
+        headers, buckets, doc_items, prices = defaultdict(list), defaultdict(list), [], []
+        today = datetime.now().date().isoformat()
+        for doc in new:
+            doc_type, doc_id, items = doc["type"], doc["id"], doc["items"]
+            entity_id = entity_ids[doc["vendor_name"]]
+            doc_items.extend((doc_type, doc_id, n, i["name"], i["qty"], i["price"]) for n, i in enumerate(items, 1))
+            if doc_type in INVOICE_BUCKETS:
+                status = doc.get("status") or (_invoice_status(items) if items else "Incomplete")
+                headers[doc_type].append((doc_id, entity_id, doc.get("date"), doc.get("total"), status))
+                buckets[INVOICE_BUCKETS[doc_type]].extend(
+                    (doc_id, i["name"], i["qty"], i["qty_fulfilled"] or 0, i["price"], _line_status(i["qty"], i["qty_fulfilled"]))
+                    for i in items
+                )
+                if doc_type == "inv_rec":
+                    prices.extend((entity_id, i["name"], i["price"], doc.get("date") or today, doc_id)
+                                  for i in items if (i["price"] or 0) > 0)
+            else:
+                status = doc.get("status") or "Completed"
+                headers[doc_type].append((doc_id, entity_id, doc.get("date"), doc.get("total"), status, doc.get("inv_id")))
+
+        for doc_type, rows in headers.items():
+            conn.executemany(_header_sql(doc_type), rows)
+        conn.executemany("""
+            INSERT INTO document_items (doc_type, doc_id, line_no, item_name, qty, price) VALUES (?, ?, ?, ?, ?, ?)
+        """, doc_items)
+        for table, rows in buckets.items():
+            conn.executemany(f"""
+                INSERT INTO {table} (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        # Baseline for the price check of future scans (history itself is not penalised)
+        record_price_history(conn, prices)
+
+        # 3. Receipts settle the open invoice lines, exactly like a scanned receipt
+        if reconcile:
+            from src.analyzer import reconcile_receipt
+            for doc in new:
+                if doc["type"] == "rec_sent":
+                    reconcile_receipt(doc["id"], doc["items"], doc.get("date"))
+
+        # 4. Merit (opt-in): every document counts as a scan, booked on its own date
+        # (undated ones today) and in date order, so a replay sees the same history
+        if book_merit:
+            dated = sorted(new, key=lambda doc: doc.get("date") or today)
+            apply_scan_outcomes(
+                (entity_ids[doc["vendor_name"]], doc["confidence_score"] is not None and doc["confidence_score"] < 90,
+                 doc.get("date") or None)
+                for doc in dated
+            )
+
+    return len(new), sum(len(doc["items"]) for doc in new), len(docs) - len(new)
+
+
+@telemetry.timed("bulk_io.import_ledger")
+def import_ledger(path, batch_rows=BATCH_ROWS, book_merit=False, reconcile=False, rejects_path=None):
+    """
+    Streams a CSV / Parquet ledger file into the database (see the layout above).
+    `book_merit=True` books every document as a scan (dated with the document);
+    `reconcile=True` settles rec_sent receipts against open invoices as they load;
+    leave it off when the file's qty_fulfilled already carries the settlement.
+    Invalid documents are skipped and listed in `rejects_path` (CSV) if given.
+    So is every part of a document whose lines are not adjacent: loading only
+    the first part would lose the rest (found by a quick first pass over the file).
+    Returns a summary dict.
+    """
+    summary = {"documents": 0, "lines": 0, "skipped": 0, "rejected": 0, "errors": []}
+    rejects_file = open(rejects_path, "w", newline="", encoding="utf-8") if rejects_path else None
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects:
+        rejects.writerow(["id", "type", "errors"])
+
+    def flush(batch):
+        loaded, lines, skipped = load_batch(batch, book_merit, reconcile)
+        summary["documents"] += loaded
+        summary["lines"] += lines
+        summary["skipped"] += skipped
+        print(f"📦 Imported {summary['documents']} documents ({summary['lines']} lines) from {os.path.basename(path)}")
+
+    try:
+        split = dict.fromkeys(split_documents(read_chunks(path, batch_rows)), False)
+        batch, batch_lines = [], 0
+        for doc in iter_documents(read_chunks(path, batch_rows)):
+            key = (doc["type"], doc["id"])
+            errors = check_document(doc)
+            if key in split:
+                # Reported once, at its first part; the later parts are dropped with it
+                if split[key]:
+                    continue
+                split[key] = True
+                errors.append("its lines are not next to each other in the file (sort the file by type, id)")
+            if errors:
+                summary["rejected"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append(f"{doc.get('type')} {doc.get('id')}: {'; '.join(errors)}")
+                if rejects:
+                    rejects.writerow([doc.get("id"), doc.get("type"), "; ".join(errors)])
+                continue
+            batch.append(doc)
+            batch_lines += max(len(doc["items"]), 1)
+            if batch_lines >= batch_rows:
+                flush(batch)
+                batch, batch_lines = [], 0
+        if batch:
+            flush(batch)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    # Fresh statistics after a large load, so the planner keeps picking the right indexes
+    get_conn().execute("PRAGMA optimize")
+    telemetry.incr("bulk_import_documents", summary["documents"])
+    return summary
+
+
+# --- EXPORT ---
+
+def _export_query(doc_type):
+    entity_col = AUDIT_ENTITY_COLUMNS[doc_type]
+    if doc_type in INVOICE_BUCKETS:
+        # Invoice lines come from the buckets: they carry the live qty_fulfilled
+        return f"""
+            SELECT t.id, '{doc_type}', e.name, t.date, t.total, t.status, NULL, NULL,
+                   b.item_name, b.qty_total, b.unit_price, b.qty_fulfilled
+            FROM {doc_type} t
+            LEFT JOIN entity_master e ON e.id = t.{entity_col}
+            LEFT JOIN {INVOICE_BUCKETS[doc_type]} b ON b.parent_id = t.id
+            ORDER BY t.rowid, b.item_id
+        """
+    # Receipts as scanned; what they settled is in the invoices' qty_fulfilled
+    return f"""
+        SELECT t.id, '{doc_type}', e.name, t.date, t.amount, t.status, t.inv_id, NULL,
+               d.item_name, d.qty, d.price, NULL
+        FROM {doc_type} t
+        LEFT JOIN entity_master e ON e.id = t.{entity_col}
+        LEFT JOIN document_items d ON d.doc_type = '{doc_type}' AND d.doc_id = t.id
+        ORDER BY t.rowid, d.line_no
+    """
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        pa, self.pq = _parquet()
+        text, number = pa.string(), pa.float64()
+        self.schema = pa.schema([(name, number if name in ("total", "confidence_score", "qty", "price", "qty_fulfilled") else text)
+                                 for name in COLUMNS])
+        self.pa, self.path, self.writer = pa, path, None
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        table = self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type, from_pandas=True) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)  # empty ledger: header-only file
+        self.writer.close()
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+@telemetry.timed("bulk_io.export_ledger")
+def export_ledger(path, doc_types=DOC_TYPES, chunk_rows=BATCH_ROWS, db_path=None):
+    """
+    Streams the ledger into a CSV / Parquet file in the import layout (so an
+    export can be imported elsewhere). Reads one consistent snapshot on its own
+    read-only connection, `chunk_rows` lines at a time; the scanner can keep
+    writing meanwhile. The file appears under `path` only once complete.
+    Returns {doc_type: lines written}.
+    """
+    from src.database_manager import DB_PATH
+
+    unknown = set(doc_types) - set(DOC_TYPES)
+    if unknown:
+        raise ValueError(f"unknown document type(s): {', '.join(sorted(unknown))}")
+    tmp_path = path + ".part"
+    sink = _ParquetSink(tmp_path) if _is_parquet(path) else _CsvSink(tmp_path)
+    conn = sqlite3.connect(f"file:{db_path or DB_PATH}?mode=ro", uri=True, isolation_level=None)
+    written = {}
+    try:
+        conn.execute("BEGIN")  # one snapshot across all four tables
+        for doc_type in doc_types:
+            cursor = conn.execute(_export_query(doc_type))
+            written[doc_type] = 0
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                sink.write(rows)
+                written[doc_type] += len(rows)
+        conn.execute("COMMIT")
+        sink.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        sink.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+
+    print(f"📤 Exported {sum(written.values())} lines to {path}")
+    return written
@@ -0,0 +1,56 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared API clients, built on first use instead of at import time.
+# Importing google.genai / groq and constructing their clients costs most of a
+# second, so nothing pays for a client it never calls (a worker that only
+# commits, a dashboard with the assistant switched off). One instance per
+# process, shared by every thread (both SDKs pool their HTTP connections).
+
+def _make_gemini():
+    from google import genai
+    return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+def _make_groq():
+    from groq import Groq
+    return Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+
+FACTORIES = {"gemini": _make_gemini, "groq": _make_groq}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(name):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            # Double-checked: two threads asking at once still build one client
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = FACTORIES[name]()
+    return client
+
+
+def set_client(name, client):
+    """Overrides a client (offline fakes in benchmarks, alternate credentials)."""
+    with _lock:
+        _clients[name] = client
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+
+
+def gemini():
+    return get_client("gemini")
+
+
+def groq():
+    return get_client("groq")
@@ -0,0 +1,66 @@
+import threading
+import functools
+from collections import OrderedDict
+from src.database_manager import ledger_version
+from src import telemetry
+
+# In-process cache for dashboard reads (DataFrames, pages, Plotly figures).
+# Every entry belongs to one ledger_version(); the first lookup after ANY commit
+# sees a new version and drops the whole cache, so stale data never survives a write
+# and Streamlit reruns between writes are served from memory.
+
+MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_state = {"version": None}
+stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _sync_version():
+    version = ledger_version()
+    if version != _state["version"]:
+        if _cache:
+            stats["invalidations"] += 1
+        _cache.clear()
+        _state["version"] = version
+
+
+def cached_call(key, loader):
+    """Returns loader() for `key`, computing it at most once per ledger version."""
+    with _lock:
+        _sync_version()
+        if key in _cache:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            telemetry.incr("view_cache_hits")
+            return _cache[key]
+        stats["misses"] += 1
+        telemetry.incr("view_cache_misses")
+
+    value = loader()
+
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def cached(fn):
+    """Decorator form of cached_call(); arguments must be hashable."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__module__, fn.__qualname__, args, tuple(sorted(kwargs.items())))
+        return cached_call(key, lambda: fn(*args, **kwargs))
+    return wrapper
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def cache_stats():
+    with _lock:
+        return dict(stats, entries=len(_cache), version=_state["version"])
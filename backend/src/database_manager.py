@@ -1,46 +1,240 @@
+import os
 import sqlite3
-import json
+import threading
+from contextlib import contextmanager
+from src import telemetry
 
-def get_conn():
-    return sqlite3.connect('database/engine_master.db')
+DB_PATH = os.getenv("ENGINE_DB_PATH", "database/engine_master.db")
 
+# Tuned for a single-writer ledger: WAL lets the dashboard read while a scan writes,
+# and synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",      # 64 MB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# {thread: {db_path: connection}}. Streamlit runs every rerun on a fresh thread, so the
+# connections of finished threads are closed whenever a new one is opened.
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Ids / names for an IN (...) list go out in slices of this size: SQLite builds
+# before 3.32 allow only 999 bound parameters per statement.
+MAX_IN_PARAMS = 500
+
+
+def chunked(values, size=MAX_IN_PARAMS):
+    """Consecutive lists of at most `size` values (one IN (...) query each)."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A per-thread connection that survives `close()`.
+    Legacy callers still do `conn = get_conn() ... conn.close()`; for them close()
+    just hands the connection back to the pool (rolling back anything left open).
+    """
+
+    def close(self):
+        if self.in_transaction and not _tx_depth(self):
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+def _open(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    # isolation_level=None: we issue BEGIN/COMMIT ourselves in transaction().
+    # check_same_thread=False only so a finished thread's connection can be closed
+    # from another one; a connection is still used by its own thread only.
+    conn = sqlite3.connect(db_path, factory=PooledConnection, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if telemetry.ENABLED:
+        # Every statement run on a pooled connection shows up in the 'sql_statements' counter
+        conn.set_trace_callback(_count_statement)
+    conn.tx_depth = 0
+    return conn
+
+
+def _count_statement(sql):
+    telemetry.incr("sql_statements")
+
+
+def _tx_depth(conn):
+    return getattr(conn, "tx_depth", 0)
+
+
+def _close_pool(pool):
+    for conn in pool.values():
+        try:
+            conn.really_close()
+        except sqlite3.Error:
+            pass
+
+
+def _sweep_dead_threads():
+    """Closes the connections of threads that have finished."""
+    with _pools_lock:
+        dead = [thread for thread in _pools if not thread.is_alive()]
+        pools = [_pools.pop(thread) for thread in dead]
+    for pool in pools:
+        _close_pool(pool)
+
+
+def get_conn(db_path=None):
+    """Returns this thread's pooled connection to the ledger (opened on first use)."""
+    db_path = db_path or DB_PATH
+    thread = threading.current_thread()
+    pool = _pools.get(thread)
+    conn = pool.get(db_path) if pool else None
+    if conn is None:
+        _sweep_dead_threads()
+        conn = _open(db_path)
+        with _pools_lock:
+            _pools.setdefault(thread, {})[db_path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(db_path=None):
+    """
+    One atomic unit of work on this thread's connection.
+    The outermost block runs BEGIN IMMEDIATE ... COMMIT (a single fsync);
+    nested blocks become SAVEPOINTs, so helpers can be composed freely and a
+    caller can wrap a whole document in one transaction.
+    """
+    conn = get_conn(db_path)
+    depth = conn.tx_depth
+
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    else:
+        conn.execute(f"SAVEPOINT sp_{depth}")
+    conn.tx_depth = depth + 1
+
+    try:
+        yield conn
+    except BaseException:
+        conn.tx_depth = depth
+        if depth == 0:
+            conn.execute("ROLLBACK")
+            telemetry.incr("rollbacks")
+        else:
+            conn.execute(f"ROLLBACK TO sp_{depth}")
+            conn.execute(f"RELEASE sp_{depth}")
+        for hook in _rollback_hooks:
+            hook()
+        raise
+    else:
+        conn.tx_depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+            telemetry.incr("commits")
+        else:
+            conn.execute(f"RELEASE sp_{depth}")
+
+
+_version_conn = None
+_version_lock = threading.Lock()
+_reset_hooks = []
+_rollback_hooks = []
+
+
+def register_reset_hook(fn):
+    """`fn()` runs at the end of close_all(): modules with their own connection or ledger-derived state drop it."""
+    _reset_hooks.append(fn)
+
+
+def register_rollback_hook(fn):
+    """`fn()` runs after any transaction() block (or savepoint) is rolled back: in-memory state built from its writes is stale."""
+    _rollback_hooks.append(fn)
+
+
+def ledger_version():
+    """
+    A number that changes whenever ANY connection (any thread or process) commits
+    to the ledger - PRAGMA data_version on a dedicated, never-writing connection.
+    Use it as part of a cache key: same version, same data.
+    """
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return _version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def close_all():
+    """Closes every pooled connection (call on shutdown or after deleting the DB file)."""
+    global _version_conn
+    with _version_lock:
+        if _version_conn is not None:
+            _version_conn.close()
+            _version_conn = None
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        _close_pool(pool)
+    for hook in _reset_hooks:
+        hook()
+
+
+@telemetry.timed("database_manager.save_audit_package")
 def save_audit_package(ai_data, file_path=None):
     """
-    Ensures 'Double-Entry' integrity: 
-    1. Saves the Header to the Audit Table (Layer 1 - The Tabs).
+    Ensures 'Double-Entry' integrity:
+    1. Saves the Header to the Audit Table and its lines to document_items (Layer 1 - The Tabs).
     2. Opens the initial Buckets in the Item Tables (Layer 2 - The Math).
+    Raises on failure so an enclosing unit of work rolls back as a whole.
     """
-    conn = get_conn()
-    cursor = conn.cursor()
-    
     doc_id = ai_data.get('id')
     doc_type = ai_data.get('type') # e.g., 'inv_rec', 'inv_sent'
     items = ai_data.get('items', [])
-    items_json = json.dumps(items)
-    
+    if not doc_id:
+        # A NULL primary key never conflicts: every retry would add another header
+        raise ValueError(f"{doc_type} document has no id")
+    # Invoices carry a 'total', receipts an 'amount' (see init_db.py)
+    amount_col = "total" if doc_type in ['inv_rec', 'inv_sent'] else "amount"
+    # Invoices open as 'Incomplete'; a receipt is a finished payment (same as the table default)
+    status = "Incomplete" if doc_type in ['inv_rec', 'inv_sent'] else "Completed"
+
     try:
-        # --- 1. SYNC TO AUDIT LAYER (Layer 1) ---
-        # This makes the entry appear in your 'Invoices' or 'Receipts' tabs.
-        cursor.execute(f"""
-            INSERT OR IGNORE INTO {doc_type} (id, date, total, items_json, status)
-            VALUES (?, ?, ?, ?, ?)
-        """, (doc_id, ai_data.get('date'), ai_data.get('total'), items_json, 'Incomplete'))
-
-        # --- 2. SYNC TO BUCKET LAYER (Layer 2) ---
-        # Only create new buckets for INVOICES.
-        if doc_type in ['inv_rec', 'inv_sent']:
-            bucket_table = "payment_to_be_sent_inv" if doc_type == "inv_rec" else "payment_to_be_received_inv"
-            
-            for item in items:
-                cursor.execute(f"""
-                    INSERT OR IGNORE INTO {bucket_table} 
+        with transaction() as conn:
+            cursor = conn.cursor()
+
+            # --- 1. SYNC TO AUDIT LAYER (Layer 1) ---
+            # This makes the entry appear in your 'Invoices' or 'Receipts' tabs.
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {doc_type} (id, date, {amount_col}, status)
+                VALUES (?, ?, ?, ?)
+            """, (doc_id, ai_data.get('date'), ai_data.get('total'), status))
+
+            # The document's own lines (all four types), one row each - see migrations v8
+            cursor.executemany("""
+                INSERT INTO document_items (doc_type, doc_id, line_no, item_name, qty, price)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(doc_type, doc_id, n, item.get('name'), item.get('qty'), item.get('price')) for n, item in enumerate(items, 1)])
+
+            # --- 2. SYNC TO BUCKET LAYER (Layer 2) ---
+            # Only create new buckets for INVOICES.
+            if doc_type in ['inv_rec', 'inv_sent']:
+                bucket_table = "payment_to_be_sent_inv" if doc_type == "inv_rec" else "payment_to_be_received_inv"
+
+                cursor.executemany(f"""
+                    INSERT OR IGNORE INTO {bucket_table}
                     (parent_id, item_name, qty_total, qty_fulfilled, unit_price, status)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (doc_id, item.get('name'), item.get('qty'), 0, item.get('price'), 'Incomplete'))
-        
-        conn.commit()
+                """, [(doc_id, item.get('name'), item.get('qty'), 0, item.get('price'), 'Incomplete') for item in items])
+
         print(f"✅ Full-Bake Sync Complete for {doc_id}")
     except Exception as e:
         print(f"❌ Sync Error: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
+        raise
@@ -0,0 +1,145 @@
+import re
+import json
+from datetime import datetime
+
+# The JSON contract every extraction has to satisfy before it may touch the ledger
+# (see PROMPT in extractor.py).
+
+DOC_TYPES = ("inv_rec", "inv_sent", "rec_rec", "rec_sent")
+
+# --- STRUCTURED OUTPUT SCHEMAS (Gemini response_schema, OpenAPI subset) ---
+ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "qty": {"type": "NUMBER"},
+        "price": {"type": "NUMBER"},
+    },
+    "required": ["name", "qty", "price"],
+}
+
+DOCUMENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "type": {"type": "STRING", "enum": list(DOC_TYPES)},
+        "vendor_name": {"type": "STRING"},
+        "date": {"type": "STRING", "nullable": True, "description": "YYYY-MM-DD"},
+        "total": {"type": "NUMBER", "nullable": True},
+        "items": {"type": "ARRAY", "items": ITEM_SCHEMA},
+        "confidence_score": {"type": "NUMBER", "description": "0-100, how sure the reading is"},
+    },
+    "required": ["type", "vendor_name", "items", "confidence_score"],
+}
+
+BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"index": {"type": "INTEGER"}, **DOCUMENT_SCHEMA["properties"]},
+        "required": ["index"] + DOCUMENT_SCHEMA["required"],
+    },
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _to_number(value):
+    """'1,250.00' / '$12' / '12.5' -> float; anything else is returned unchanged."""
+    if isinstance(value, str):
+        cleaned = re.sub(r"[^\d.\-]", "", value)
+        try:
+            return float(cleaned) if cleaned else value
+        except ValueError:
+            return value
+    return value
+
+
+def coerce_document(data):
+    """Cheap local fixes before validation: numeric strings -> numbers, null items -> []."""
+    if not isinstance(data, dict):
+        return data
+    for field in ("total", "confidence_score"):
+        if data.get(field) is not None:
+            data[field] = _to_number(data[field])
+    if data.get("items") is None:
+        data["items"] = []
+    for item in data["items"] if isinstance(data["items"], list) else []:
+        if isinstance(item, dict):
+            for field in ("qty", "price"):
+                if item.get(field) is not None:
+                    item[field] = _to_number(item[field])
+    return data
+
+
+def validate_document(data):
+    """Returns a list of problems with one extracted document ([] means valid)."""
+    if not isinstance(data, dict):
+        return ["document is not a JSON object"]
+
+    errors = []
+    if data.get("type") not in DOC_TYPES:
+        errors.append(f"type must be one of {', '.join(DOC_TYPES)}")
+    if data.get("total") is not None and not _is_number(data.get("total")):
+        errors.append("total must be a number")
+    confidence = data.get("confidence_score")
+    if confidence is not None and not (_is_number(confidence) and 0 <= confidence <= 100):
+        errors.append("confidence_score must be a number from 0 to 100")
+    if data.get("date") not in (None, ""):
+        try:
+            datetime.strptime(str(data["date"]), "%Y-%m-%d")
+        except ValueError:
+            errors.append("date must be YYYY-MM-DD")
+
+    items = data.get("items")
+    if not isinstance(items, list):
+        errors.append("items must be a list")
+        return errors
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("name"):
+            errors.append(f"items[{i}] needs a name")
+            continue
+        for field in ("qty", "price"):
+            if item.get(field) is not None and not _is_number(item.get(field)):
+                errors.append(f"items[{i}].{field} must be a number")
+    return errors
+
+
+# --- LOCAL JSON REPAIR (no model call) ---
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PY_LITERALS = {r"\bTrue\b": "true", r"\bFalse\b": "false", r"\bNone\b": "null"}
+
+
+def repair_json(text):
+    """Best-effort fix of the usual LLM JSON slips; returns a string for json.loads."""
+    text = _FENCE.sub("", text).strip()
+    text = text.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+
+    # Keep only the outermost object/array (drops chatter before/after it)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if starts:
+        start = min(starts)
+        end = text.rfind("}" if text[start] == "{" else "]")
+        if end > start:
+            text = text[start:end + 1]
+
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    for pattern, replacement in _PY_LITERALS.items():
+        text = re.sub(pattern, replacement, text)
+    if '"' not in text:
+        text = text.replace("'", '"')  # Python-dict style answer
+    return text
+
+
+def parse_model_json(text):
+    """json.loads, falling back to repair_json(); raises ValueError if both fail."""
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        pass
+    try:
+        return json.loads(repair_json(text or ""))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"unparseable JSON: {e}") from e
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from src.database_manager import get_conn, transaction
+from src import telemetry
+
+# Lives next to the ledger but in its own file, so hard_reset_db() keeps the
+# (expensive) model answers and cache writes never contend with ledger commits.
+CACHE_DB_PATH = os.getenv("EXTRACTION_CACHE_PATH", "database/extraction_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "30"))
+EVICT_EVERY = 50  # puts between eviction sweeps
+
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_schema_ready = False
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        stats[name] += n
+    telemetry.incr(f"extraction_cache_{name}", n)
+
+
+def _ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with transaction(CACHE_DB_PATH) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                cache_key TEXT PRIMARY KEY,
+                result_json TEXT,
+                size_bytes INTEGER,
+                created_at REAL,
+                last_hit_at REAL,
+                hit_count INTEGER DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_hit ON extraction_cache (last_hit_at)")
+    _schema_ready = True
+
+
+def make_key(file_bytes, prompt, model):
+    """SHA-256 over the document bytes plus everything that shapes the answer."""
+    h = hashlib.sha256()
+    h.update(file_bytes)
+    h.update(b"\0" + prompt.encode("utf-8"))
+    h.update(b"\0" + model.encode("utf-8"))
+    return h.hexdigest()
+
+
+def get(cache_key):
+    """Returns the cached extraction (parsed JSON) or None on a miss/expired entry."""
+    _ensure_schema()
+    min_created = time.time() - CACHE_MAX_AGE_DAYS * 86400
+    conn = get_conn(CACHE_DB_PATH)
+    row = conn.execute(
+        "SELECT result_json FROM extraction_cache WHERE cache_key = ? AND created_at >= ?",
+        (cache_key, min_created),
+    ).fetchone()
+
+    if not row:
+        _count("misses")
+        return None
+
+    with transaction(CACHE_DB_PATH) as conn:
+        conn.execute(
+            "UPDATE extraction_cache SET last_hit_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+            (time.time(), cache_key),
+        )
+    _count("hits")
+    return json.loads(row[0])
+
+
+def put(cache_key, result):
+    """Stores a successful extraction; failures are never cached."""
+    _ensure_schema()
+    payload = json.dumps(result)
+    now = time.time()
+    with transaction(CACHE_DB_PATH) as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO extraction_cache (cache_key, result_json, size_bytes, created_at, last_hit_at, hit_count)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (cache_key, payload, len(payload), now, now))
+    _count("stores")
+
+    if stats["stores"] % EVICT_EVERY == 0:
+        evict()
+
+
+def evict(max_entries=None, max_age_days=None):
+    """Drops expired rows, then the least recently used ones above the size cap."""
+    _ensure_schema()
+    max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    max_age_days = CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+
+    with transaction(CACHE_DB_PATH) as conn:
+        removed = conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?",
+            (time.time() - max_age_days * 86400,),
+        ).rowcount
+        removed += conn.execute("""
+            DELETE FROM extraction_cache WHERE cache_key IN (
+                SELECT cache_key FROM extraction_cache
+                ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (max_entries,)).rowcount
+    _count("evictions", removed)
+    return removed
+
+
+def cache_stats():
+    """Hit/miss counters for this process plus what is on disk."""
+    _ensure_schema()
+    entries, size = get_conn(CACHE_DB_PATH).execute(
+        "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM extraction_cache"
+    ).fetchone()
+    with _stats_lock:
+        snapshot = dict(stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+    snapshot["entries"] = entries
+    snapshot["size_bytes"] = size
+    return snapshot
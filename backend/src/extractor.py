@@ -1,44 +1,237 @@
 import os
 import json
-import time
-import PIL.Image
-from dotenv import load_dotenv
-from google import genai
-from google.genai import errors # Import this to catch the 429 error
+import random
+from concurrent.futures import ThreadPoolExecutor
+from src.rate_limiter import TokenBucket
+from src import extraction_cache
+from src import preprocess
+from src import telemetry
+from src import clients
+from src.doc_schema import DOCUMENT_SCHEMA, BATCH_SCHEMA, coerce_document, parse_model_json, validate_document
 
-load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# google.genai (and its client) load on the first model call - see clients.py
 
-def analyze_document(image_path):
-    img = PIL.Image.open(image_path)
-    
-    prompt = """
+# Requests-per-minute quota of the Gemini key; every extraction worker shares it
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))  # 0 = no client-side throttling
+gemini_limiter = TokenBucket(rate=GEMINI_RPM / 60)
+
+MODEL = 'gemini-2.5-flash'
+MAX_PAGE_WORKERS = 4
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 2.0   # seconds; doubles per attempt, plus up to the same again as jitter
+BACKOFF_CAP = 60.0
+BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", "8"))
+BATCH_MAX_BYTES = 200_000  # only small single-page scans (thermal receipts) are packed together
+
+PROMPT = """
     Analyze this document. Return a JSON object ONLY:
     {
       "type": "inv_rec" | "inv_sent" | "rec_rec" | "rec_sent",
       "vendor_name": "Official Name",
       "date": "YYYY-MM-DD",
       "total": 0.00,
-      "items": [{"name": "item", "qty": 1, "price": 0.00}]
+      "items": [{"name": "item", "qty": 1, "price": 0.00}],
+      "confidence_score": 0-100 (how sure you are of this reading)
     }
     """
 
-    # We will try 3 times before giving up
-    for attempt in range(3):
+BATCH_PROMPT = """
+    You are given {n} separate documents, each introduced by "Document <index>:".
+    Analyze EACH one independently. Return a JSON array ONLY, one object per document:
+    [{{
+      "index": 0,
+      "type": "inv_rec" | "inv_sent" | "rec_rec" | "rec_sent",
+      "vendor_name": "Official Name",
+      "date": "YYYY-MM-DD",
+      "total": 0.00,
+      "items": [{{"name": "item", "qty": 1, "price": 0.00}}],
+      "confidence_score": 0-100 (how sure you are of this reading)
+    }}]
+    """
+
+def _cache_key(image_path):
+    # Same bytes + same prompt + same model => same answer, skip the API call
+    with open(image_path, 'rb') as f:
+        return extraction_cache.make_key(f.read(), PROMPT, f"{MODEL}|{preprocess.SETTINGS_TAG}|schema:v2")
+
+def _retry_delay(error, attempt):
+    """Server-suggested delay (RetryInfo / Retry-After) if any, else exponential backoff with jitter."""
+    details = error.details if isinstance(error.details, dict) else {}
+    for detail in details.get("error", {}).get("details", []) or []:
+        delay = str(detail.get("retryDelay", "")).rstrip("s")
+        if delay:
+            try:
+                return float(delay)
+            except ValueError:
+                pass
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after", "").isdigit():
+        return float(headers["retry-after"])
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+
+def _generate_json(contents, schema, check):
+    """
+    Calls Gemini with schema-constrained JSON output and returns the parsed answer.
+    - malformed JSON is repaired locally first (doc_schema.parse_model_json)
+    - `check(data)` returns (data, problems); problems trigger ONE targeted re-ask
+      that tells the model exactly what was wrong
+    - 429/5xx back off (shared limiter pause) instead of a fixed 60 s sleep
+    """
+    from google.genai import errors, types  # errors: to catch the 429 error
+
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+    feedback = []
+
+    for attempt in range(MAX_ATTEMPTS):
+        with telemetry.span("extractor.rate_limit_wait"):
+            gemini_limiter.acquire()
         try:
-            # SWITCHED TO LITE for better quota
-            response = client.models.generate_content(
-                model='gemini-2.5-flash', 
-                contents=[prompt, img]
-            )
-            raw_text = response.text.strip().replace('```json', '').replace('```', '')
-            return json.loads(raw_text)
-
-        except errors.ClientError as e:
-            if "429" in str(e):
-                print(f"⚠️ Quota hit! Waiting 60 seconds (Attempt {attempt+1}/3)...")
-                time.sleep(60) # Wait for the rolling window to reset
+            telemetry.incr("model_calls")
+            with telemetry.span("extractor.model_call"):
+                response = clients.gemini().models.generate_content(model=MODEL, contents=contents + feedback, config=config)
+        except errors.APIError as e:
+            if e.code == 429 or e.code >= 500:
+                delay = _retry_delay(e, attempt)
+                print(f"⚠️ Gemini {e.code}: backing off {delay:.1f}s (Attempt {attempt+1}/{MAX_ATTEMPTS})...")
+                telemetry.incr(f"model_retries_{e.code}")
+                # The pause itself is paid by the next acquire() (rate_limit_wait)
+                gemini_limiter.pause(delay)
+                continue
+            print(f"❌ Other Error: {e}")
+            return None
+
+        try:
+            data = parse_model_json(response.text)
+        except ValueError as e:
+            print(f"⚠️ Unreadable answer ({e}), asking again...")
+            telemetry.incr("model_reasks")
+            feedback = ["Your previous answer was not valid JSON. Reply with the JSON only."]
+            continue
+
+        data, problems = check(data)
+        if not problems:
+            return data
+        print(f"⚠️ Answer broke the contract: {'; '.join(problems)}")
+        telemetry.incr("model_reasks")
+        feedback = [f"Your previous answer had these problems: {'; '.join(problems)}. "
+                    f"Here it is: {json.dumps(data)[:2000]}. Reply with the corrected JSON only."]
+    return None
+
+def _check_document(data):
+    data = coerce_document(data)
+    return data, validate_document(data)
+
+def _check_batch(data):
+    if not isinstance(data, list):
+        return data, ["expected a JSON array"]
+    # Elements are validated one by one in analyze_batch(); bad ones fall back individually
+    return [coerce_document(d) for d in data], []
+
+def extract_page(image_bytes):
+    """One model call for one preprocessed page (JPEG bytes)."""
+    from google.genai import types
+    image = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
+    return _generate_json([PROMPT, image], DOCUMENT_SCHEMA, _check_document)
+
+def merge_pages(pages):
+    """
+    Folds per-page extractions of one multi-page document into a single record:
+    header fields from the first page that has them, the total from the last
+    page that states one (it's printed at the end), every page's items and
+    the lowest page confidence.
+    If any page failed the whole document fails: a record missing a page's
+    items would be booked (and cached) as if it were complete.
+    """
+    missing = [i + 1 for i, p in enumerate(pages) if not p]
+    if not pages or missing:
+        if missing:
+            print(f"❌ Page(s) {missing} of {len(pages)} could not be read; dropping the document")
+        return None
+
+    merged = {}
+    for page in pages:
+        for key, value in page.items():
+            if key not in ('items', 'total', 'confidence_score') and value not in (None, "") and key not in merged:
+                merged[key] = value
+    totals = [p.get('total') for p in pages if p.get('total') not in (None, "")]
+    merged['total'] = totals[-1] if totals else None
+    merged['items'] = [item for p in pages for item in (p.get('items') or [])]
+    confidences = [p['confidence_score'] for p in pages if p.get('confidence_score') is not None]
+    if confidences:
+        merged['confidence_score'] = min(confidences)
+    return merged
+
+@telemetry.timed("extractor.analyze_document")
+def analyze_document(image_path):
+    cache_key = _cache_key(image_path)
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        print(f"♻️ Cache hit for {image_path}")
+        return cached
+
+    # Downscaled grayscale JPEGs, one per page (PDFs are split)
+    return _extract_pages(cache_key, preprocess.prepare_document(image_path))
+
+def _extract_pages(cache_key, pages):
+    if len(pages) == 1:
+        result = extract_page(pages[0])
+    else:
+        # Pages of one document are extracted in parallel (still inside the shared quota)
+        with ThreadPoolExecutor(max_workers=min(MAX_PAGE_WORKERS, len(pages))) as pool:
+            result = merge_pages(list(pool.map(extract_page, pages)))
+
+    if result:
+        extraction_cache.put(cache_key, result)
+    return result
+
+def _extract_batch(images):
+    """One model call for several small documents; returns {index: extracted dict}."""
+    from google.genai import types
+    contents = [BATCH_PROMPT.format(n=len(images))]
+    for i, image_bytes in enumerate(images):
+        contents += [f"Document {i}:", types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")]
+
+    parsed = _generate_json(contents, BATCH_SCHEMA, _check_batch) or []
+    return {d.get('index'): d for d in parsed if isinstance(d, dict)}
+
+@telemetry.timed("extractor.analyze_batch")
+def analyze_batch(image_paths, batch_size=BATCH_SIZE):
+    """
+    Batch mode: packs up to `batch_size` small single-page documents into ONE
+    generate_content call (a JSON array keyed by input index). Each element is
+    validated on its own; anything missing or invalid - and every large or
+    multi-page document - goes through analyze_document() instead.
+    Returns {path: extracted dict or None}.
+    """
+    results, small, fallback = {}, [], []
+
+    for path in image_paths:
+        cache_key = _cache_key(path)
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            results[path] = cached
+            continue
+        pages = preprocess.prepare_document(path)
+        if len(pages) == 1 and len(pages[0]) <= BATCH_MAX_BYTES:
+            small.append((path, cache_key, pages[0]))
+        else:
+            fallback.append((path, cache_key, pages))
+
+    for start in range(0, len(small), batch_size):
+        group = small[start:start + batch_size]
+        answers = _extract_batch([image for _, _, image in group]) if len(group) > 1 else {}
+        for index, (path, cache_key, image) in enumerate(group):
+            doc = answers.get(index)
+            if doc is not None:
+                doc = {k: v for k, v in doc.items() if k != 'index'}
+            if doc is not None and not validate_document(doc):
+                extraction_cache.put(cache_key, doc)
+                results[path] = doc
             else:
-                print(f"❌ Other Error: {e}")
-                break 
-    return None
\ No newline at end of file
+                fallback.append((path, cache_key, [image]))
+
+    if fallback and small:
+        print(f"↩️ {len(fallback)} document(s) sent back to single-document mode")
+    for path, cache_key, pages in fallback:
+        results[path] = _extract_pages(cache_key, pages)
+    return results
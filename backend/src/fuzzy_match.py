@@ -0,0 +1,153 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+from datetime import datetime
+from collections import defaultdict
+from src import database_manager
+
+# OCR rarely spells an item the same way twice ("A4 Paper 500s" / "A4 paper (500)").
+# Receipt lines that find no exact invoice bucket are matched through a trigram
+# inverted index over the names of open invoice lines:
+# - names are normalized first (case, accents, punctuation, plural 's'),
+# - a lookup only scores names that share one of the query's rarest trigrams,
+#   so cost follows the number of similar names, not the number of open lines,
+# - the index is built once and then follows the bucket table by item_id.
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.6"))
+MAX_CANDIDATES = 5
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def normalize_name(name):
+    text = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode().lower()
+    tokens = _NON_ALNUM.sub(" ", text).split()
+    # '500s' -> '500', 'boxes' -> 'boxe', 'pens' -> 'pen' (applied to both sides, so it only has to be consistent)
+    return " ".join(t[:-1] if len(t) > 2 and t.endswith("s") and not t.endswith("ss") else t for t in tokens)
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Dice coefficient over trigrams of two normalized names (0..1)."""
+    ga, gb = trigrams(a), trigrams(b)
+    return 2 * len(ga & gb) / (len(ga) + len(gb)) if ga and gb else 0.0
+
+
+class ItemNameIndex:
+    """Trigram -> names postings over the item names of open invoice lines."""
+
+    def __init__(self, bucket_table="payment_to_be_received_inv"):
+        self.bucket_table = bucket_table
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.postings = defaultdict(set)   # trigram -> normalized names
+        self.names = defaultdict(set)      # normalized name -> raw item names
+        self.grams = {}                    # normalized name -> its trigrams
+        self.last_item_id = 0
+
+    def add(self, item_name):
+        key = normalize_name(item_name)
+        if not key:
+            return
+        self.names[key].add(item_name)
+        if key not in self.grams:
+            self.grams[key] = trigrams(key)
+            for gram in self.grams[key]:
+                self.postings[gram].add(key)
+
+    def discard(self, item_name):
+        key = normalize_name(item_name)
+        raw = self.names.get(key)
+        if raw is None:
+            return
+        raw.discard(item_name)
+        if not raw:
+            del self.names[key]
+            for gram in self.grams.pop(key):
+                self.postings[gram].discard(key)
+
+    def sync(self, cursor):
+        """Adds open lines created since the last sync (the first call builds the index)."""
+        # Lines above last_item_id were deleted under us (reset / rollback in another
+        # process): their ids will be handed out again, so start over
+        newest = cursor.execute(f"SELECT MAX(item_id) FROM {self.bucket_table}").fetchone()[0] or 0
+        if newest < self.last_item_id:
+            self.clear()
+        rows = cursor.execute(f"""
+            SELECT item_id, item_name FROM {self.bucket_table}
+            WHERE item_id > ? AND status != 'Completed'
+            ORDER BY item_id
+        """, (self.last_item_id,)).fetchall()
+        for item_id, item_name in rows:
+            self.add(item_name)
+            self.last_item_id = item_id
+        return len(rows)
+
+    def candidates(self, item_name, threshold=FUZZY_THRESHOLD, limit=MAX_CANDIDATES):
+        """[(raw item name, score)] best first. Names whose numbers differ never match (A4 500 vs A4 250)."""
+        query = normalize_name(item_name)
+        if not query:
+            return []
+        query_grams = trigrams(query)
+        query_numbers = _NUMBER.findall(query)
+
+        # Prefix filter: a name scoring >= threshold shares at least min_overlap trigrams
+        # with the query, so it must appear under one of the (n - min_overlap + 1)
+        # rarest query trigrams - the long postings of common trigrams are never walked.
+        min_overlap = max(math.ceil(threshold * len(query_grams) / (2 - threshold) - 1e-9), 1)
+        rarest = sorted(query_grams, key=lambda g: len(self.postings.get(g, ())))
+        keys = set().union(*(self.postings.get(g, ()) for g in rarest[:len(query_grams) - min_overlap + 1]))
+
+        scored = []
+        for key in keys:
+            grams = self.grams[key]
+            score = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+            if score >= threshold and _NUMBER.findall(key) == query_numbers:
+                scored += [(raw, round(score, 3)) for raw in self.names[key] if raw != item_name]
+        scored.sort(key=lambda c: (-c[1], c[0]))
+        return scored[:limit]
+
+
+_index = ItemNameIndex()
+
+
+def reset_index():
+    """
+    Starts over from an empty index. Runs after every rollback (the lines it
+    already saw may be gone and their item_ids reused) and after close_all().
+    """
+    with _index.lock:
+        _index.clear()
+
+
+database_manager.register_reset_hook(reset_index)
+database_manager.register_rollback_hook(reset_index)
+
+
+def find_candidates(cursor, item_name, threshold=FUZZY_THRESHOLD):
+    """Candidates among open receivable invoice lines, after catching up with new lines."""
+    with _index.lock:
+        _index.sync(cursor)
+        return _index.candidates(item_name, threshold)
+
+
+def forget(item_name):
+    """Drops a name that turned out to have no open line left."""
+    with _index.lock:
+        _index.discard(item_name)
+
+
+def record_matches(cursor, receipt_id, matches):
+    """Audit trail for every fuzzy allocation: [(receipt_name, matched_name, score, qty)]."""
+    cursor.executemany("""
+        INSERT INTO fuzzy_match_audit (receipt_id, receipt_item, matched_item, score, qty, matched_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [(receipt_id, *match, datetime.now().isoformat()) for match in matches])
@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.extractor import analyze_document, analyze_batch
+from src.processor import commit_document
+
+# Extraction is network-bound, so threads are enough; the Gemini token bucket
+# (see extractor.py) keeps the pool inside the provider quota.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+
+def _extract_one(path):
+    return {path: analyze_document(path)}
+
+def ingest_files(file_paths, max_workers=INGEST_WORKERS, batch_size=1):
+    """
+    Extracts many documents concurrently and commits them through a single writer.
+    Worker threads only call the model; the calling thread is the only one that
+    touches the ledger, one commit_document() transaction per file.
+    With batch_size > 1 each worker packs that many small scans into one model
+    call (extractor.analyze_batch).
+    Yields one result dict per file as soon as it is committed (for progress bars):
+        {"path": ..., "ok": bool, "doc_id": ..., "error": ...}
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if batch_size > 1:
+            groups = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+            futures = {pool.submit(analyze_batch, group, batch_size): group for group in groups}
+        else:
+            futures = {pool.submit(_extract_one, path): [path] for path in file_paths}
+        try:
+            for future in as_completed(futures):
+                try:
+                    extracted = future.result()
+                except Exception as e:
+                    print(f"❌ Extraction Error: {e}")
+                    extracted = {path: e for path in futures[future]}
+
+                for path in futures[future]:
+                    result = {"path": path, "ok": False, "doc_id": None, "error": None}
+                    ai_json_result = extracted.get(path)
+                    try:
+                        if isinstance(ai_json_result, Exception):
+                            raise ai_json_result
+                        if not ai_json_result:
+                            raise ValueError("AI extraction returned no data")
+                        commit_document(ai_json_result, path)
+                        result["ok"] = True
+                        result["doc_id"] = ai_json_result.get('id')
+                    except Exception as e:
+                        print(f"❌ Ingestion Error ({path}): {e}")
+                        result["error"] = str(e)
+                    yield result
+        finally:
+            # Consumer stopped early: drop whatever has not started yet
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from src.database_manager import get_conn, transaction
+from src.processor import commit_document, document_id, file_hash
+from src.market_watcher import get_inflation_rate
+
+# Durable ingestion queue (table ingest_jobs, migration v5) for the headless pipeline.
+#
+#   queued -> extracting -> extracted -> committed
+#                 |              |
+#                 +--> failed <--+      (after MAX_ATTEMPTS; --retry-failed re-queues)
+#
+# - A job is keyed by the SHA-256 of the file, so the same document dropped twice
+#   (or a file left behind by a crash after its commit) is never booked again.
+# - 'extracting' is held under a lease that a heartbeat keeps alive; if the worker
+#   dies the lease runs out and any worker picks the job up again.
+# - The model answer is stored on the job ('extracted'), so a crash before the
+#   commit does not pay for the extraction twice.
+# - The ledger write and the 'committed' state land in the same transaction.
+
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+JOB_COLUMNS = "id, doc_hash, path, state, attempts, lease_owner, lease_expires, result_json, doc_id, error"
+
+
+def _row_to_job(row):
+    return dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row)) if row else None
+
+
+def enqueue(path):
+    """Registers a file; returns its job (an existing one if this content was seen before)."""
+    doc_hash = file_hash(path)
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO ingest_jobs (doc_hash, path, state, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+            (doc_hash, path, now, now),
+        )
+        # Same content under a new name/location: follow the file
+        conn.execute("UPDATE ingest_jobs SET path = ? WHERE doc_hash = ? AND state != 'committed' AND path != ?", (path, doc_hash, path))
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE doc_hash = ?", (doc_hash,)).fetchone()
+    return _row_to_job(row)
+
+
+def claim(worker_id=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """Leases the oldest queued job (or one whose lease expired) to `worker_id`. None if idle."""
+    now = time.time()
+    # BEGIN IMMEDIATE: two workers can never claim the same row
+    with transaction() as conn:
+        row = conn.execute(f"""
+            SELECT {JOB_COLUMNS} FROM ingest_jobs
+            WHERE state = 'queued' OR (state = 'extracting' AND lease_expires < ?)
+            ORDER BY id LIMIT 1
+        """, (now,)).fetchone()
+        if not row:
+            return None
+        conn.execute("""
+            UPDATE ingest_jobs
+            SET state = 'extracting', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+            WHERE id = ?
+        """, (worker_id, now + lease_seconds, now, row[0]))
+    job = _row_to_job(row)
+    job.update(state="extracting", lease_owner=worker_id, attempts=job["attempts"] + 1)
+    return job
+
+
+def heartbeat(job_id, worker_id=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """Extends the lease. False means it was lost (expired and taken over)."""
+    with transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE ingest_jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND state = 'extracting'",
+            (time.time() + lease_seconds, time.time(), job_id, worker_id),
+        )
+    return cursor.rowcount == 1
+
+
+@contextmanager
+def keep_alive(job_id, worker_id=WORKER_ID, lease_seconds=LEASE_SECONDS):
+    """Renews the lease in the background (every third of it) while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                if not heartbeat(job_id, worker_id, lease_seconds):
+                    print(f"⚠️ Lost lease on job {job_id}")
+                    return
+            except Exception as e:
+                print(f"⚠️ Heartbeat failed for job {job_id}: {e}")
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def mark_extracted(job, result, worker_id=WORKER_ID):
+    """Stores the model answer. Ignored if the lease was lost meanwhile (the new owner's answer wins)."""
+    # Same id as the Streamlit scanner gives this file (processor.document_id)
+    if not result.get('id'):
+        result['id'] = document_id(job['doc_hash'])
+    with transaction() as conn:
+        cursor = conn.execute("""
+            UPDATE ingest_jobs
+            SET state = 'extracted', result_json = ?, doc_id = ?, lease_owner = NULL, lease_expires = NULL, error = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND state = 'extracting'
+        """, (json.dumps(result), str(result['id']), time.time(), job["id"], worker_id))
+    return cursor.rowcount == 1
+
+
+def mark_failed(job, error, worker_id=None):
+    """Back to 'queued' for another attempt, or 'failed' once MAX_ATTEMPTS is used up."""
+    state = "failed" if job["attempts"] >= MAX_ATTEMPTS else "queued"
+    owner_clause, params = "", [state, str(error), time.time(), job["id"]]
+    if worker_id:
+        owner_clause = " AND lease_owner = ?"
+        params.append(worker_id)
+    with transaction() as conn:
+        conn.execute(f"""
+            UPDATE ingest_jobs
+            SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND state != 'committed'{owner_clause}
+        """, params)
+    return state
+
+
+def commit_extracted(limit=None):
+    """
+    Writes every 'extracted' job to the ledger, one transaction per document that
+    also flips the job to 'committed' - so a crash can never leave a document
+    booked but still pending (or the other way round). Returns the committed jobs.
+    """
+    sql = f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE state = 'extracted' ORDER BY id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    committed = []
+    for job in map(_row_to_job, get_conn().execute(sql).fetchall()):
+        try:
+            result = json.loads(job["result_json"])
+            # Fetched before BEGIN IMMEDIATE: a cold cache is an HTTP call, not to be made holding the write lock
+            inflation = get_inflation_rate() if result.get('type') == 'inv_rec' else None
+            with transaction() as conn:
+                # Re-check inside the write lock: another process may have committed it
+                state = conn.execute("SELECT state FROM ingest_jobs WHERE id = ?", (job["id"],)).fetchone()[0]
+                if state != "extracted":
+                    continue
+                commit_document(result, inflation=inflation)
+                conn.execute("UPDATE ingest_jobs SET state = 'committed', error = NULL, updated_at = ? WHERE id = ?", (time.time(), job["id"]))
+            committed.append(job)
+        except Exception as e:
+            print(f"❌ Commit Error ({job['path']}): {e}")
+            mark_failed(job, e)
+    return committed
+
+
+def release(worker_id=WORKER_ID):
+    """Hands this worker's in-flight jobs back to the queue (clean shutdown)."""
+    with transaction() as conn:
+        cursor = conn.execute("""
+            UPDATE ingest_jobs
+            SET state = 'queued', attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE lease_owner = ? AND state = 'extracting'
+        """, (time.time(), worker_id))
+    return cursor.rowcount
+
+
+def requeue_failed():
+    with transaction() as conn:
+        cursor = conn.execute("UPDATE ingest_jobs SET state = 'queued', attempts = 0, updated_at = ? WHERE state = 'failed'", (time.time(),))
+    return cursor.rowcount
+
+
+def counts():
+    """{state: number of jobs}"""
+    return dict(get_conn().execute("SELECT state, COUNT(*) FROM ingest_jobs GROUP BY state").fetchall())
+
+
+def pending():
+    """Jobs that still need work (queued, being extracted or waiting for their commit)."""
+    c = counts()
+    return c.get("queued", 0) + c.get("extracting", 0) + c.get("extracted", 0)
@@ -0,0 +1,136 @@
+import pandas as pd
+from src.database_manager import get_conn
+from src.data_cache import cached_call
+from src import telemetry
+from src.migrations import AUDIT_ENTITY_COLUMNS, BUCKET_TABLES
+
+# Dashboard reads: keyset-paginated (no OFFSET scans, no unbounded SELECTs) and
+# cached per ledger version (see data_cache.py), so reruns between writes never touch SQLite.
+
+PAGE_SIZE = 50
+
+AUDIT_COLUMNS = {
+    "inv_rec": "id, date, total, status",
+    "inv_sent": "id, date, total, status",
+    "rec_rec": "id, inv_id, date, amount, status",
+    "rec_sent": "id, inv_id, date, amount, status",
+}
+
+
+def _page(sql, params, limit, key_cols):
+    """Runs a LIMIT n+1 query; returns (DataFrame without key columns, next_cursor or None)."""
+    with telemetry.span("ledger_queries.page"):
+        df = pd.read_sql_query(sql, get_conn(), params=params + [limit + 1])
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        last = df.iloc[-1]
+        next_cursor = tuple(last[c] for c in key_cols)
+    return df.drop(columns=key_cols).reset_index(drop=True), next_cursor
+
+
+def audit_page(table, status=None, date_from=None, date_to=None, entity_id=None, after=None, limit=PAGE_SIZE):
+    """One page of an audit table (newest first). Pass the returned cursor as `after` for the next page."""
+    if table not in AUDIT_COLUMNS:
+        raise ValueError(f"Unknown audit table: {table}")
+
+    def load():
+        where, params = [], []
+        if status:
+            where.append("status = ?"); params.append(status)
+        if date_from:
+            where.append("date >= ?"); params.append(str(date_from))
+        if date_to:
+            where.append("date <= ?"); params.append(str(date_to))
+        if entity_id:
+            where.append(f"{AUDIT_ENTITY_COLUMNS[table]} = ?"); params.append(entity_id)
+        if after:
+            where.append("rowid < ?"); params.append(int(after[0]))
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        sql = f"SELECT rowid AS _key, {AUDIT_COLUMNS[table]} FROM {table} {clause} ORDER BY rowid DESC LIMIT ?"
+        return _page(sql, params, limit, ["_key"])
+
+    return cached_call(("audit", table, status, str(date_from), str(date_to), entity_id, after, limit), load)
+
+
+def bucket_page(table, status=None, parent_id=None, after=None, limit=PAGE_SIZE):
+    """One page of a bucket tracker (newest lines first)."""
+    if table not in BUCKET_TABLES:
+        raise ValueError(f"Unknown bucket table: {table}")
+
+    def load():
+        where, params = [], []
+        if status:
+            where.append("status = ?"); params.append(status)
+        if parent_id:
+            where.append("parent_id = ?"); params.append(parent_id)
+        if after:
+            where.append("item_id < ?"); params.append(int(after[0]))
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        sql = f"""
+            SELECT item_id AS _key, parent_id, item_name, qty_total, qty_fulfilled, status
+            FROM {table} {clause} ORDER BY item_id DESC LIMIT ?
+        """
+        return _page(sql, params, limit, ["_key"])
+
+    return cached_call(("bucket", table, status, parent_id, after, limit), load)
+
+
+def merit_trail_page(entity_id=None, after=None, limit=PAGE_SIZE):
+    """One page of the merit audit trail, newest first, keyed on (timestamp, rowid)."""
+
+    def load():
+        where, params = [], []
+        if entity_id:
+            where.append("t.entity_id = ?"); params.append(entity_id)
+        if after:
+            where.append("(t.timestamp, t.rowid) < (?, ?)"); params.extend([after[0], int(after[1])])
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        sql = f"""
+            SELECT t.timestamp AS _ts, t.rowid AS _key, e.name, t.change, t.reason, t.timestamp
+            FROM merit_audit_trail t JOIN entity_master e ON t.entity_id = e.id
+            {clause} ORDER BY t.timestamp DESC, t.rowid DESC LIMIT ?
+        """
+        return _page(sql, params, limit, ["_ts", "_key"])
+
+    return cached_call(("merit", entity_id, after, limit), load)
+
+
+def entity_scores():
+    """Master scores (one row per entity)."""
+    return cached_call(("entity_scores",), lambda: pd.read_sql_query("SELECT name, merit, streak FROM entity_master ORDER BY name", get_conn()))
+
+
+def entity_options():
+    """{name: id} for the entity filter dropdowns."""
+    return cached_call(("entity_options",), lambda: dict(get_conn().execute("SELECT name, id FROM entity_master ORDER BY name").fetchall()))
+
+
+def item_totals(doc_types=("rec_rec", "rec_sent"), date_from=None, date_to=None, limit=PAGE_SIZE):
+    """Top items by amount over the line items of `doc_types` (one GROUP BY on document_items, see migrations v8)."""
+    doc_types = [t for t in doc_types if t in AUDIT_COLUMNS]
+    if not doc_types:
+        raise ValueError("No known document type given")
+
+    def load():
+        params = list(doc_types)
+        join = where = ""
+        if date_from or date_to:
+            # Dates live on the headers
+            headers = " UNION ALL ".join(f"SELECT '{t}' AS doc_type, id, date FROM {t}" for t in doc_types)
+            join = f"JOIN ({headers}) h ON h.doc_type = d.doc_type AND h.id = d.doc_id"
+            if date_from:
+                where += " AND h.date >= ?"; params.append(str(date_from))
+            if date_to:
+                where += " AND h.date <= ?"; params.append(str(date_to))
+        sql = f"""
+            SELECT d.item_name, COUNT(DISTINCT d.doc_type || ':' || d.doc_id) AS documents,
+                   SUM(d.qty) AS qty, ROUND(SUM(d.qty * d.price), 2) AS amount, ROUND(AVG(d.price), 2) AS avg_price
+            FROM document_items d {join}
+            WHERE d.doc_type IN ({','.join('?' * len(doc_types))}) {where}
+            GROUP BY d.item_name ORDER BY amount DESC LIMIT ?
+        """
+        with telemetry.span("ledger_queries.item_totals"):
+            return pd.read_sql_query(sql, get_conn(), params=params + [limit])
+
+    return cached_call(("item_totals", tuple(doc_types), str(date_from), str(date_to), limit), load)
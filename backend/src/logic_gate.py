@@ -1,17 +1,105 @@
+from datetime import datetime
 from src.market_watcher import get_inflation_rate
-from src.merit_engine import apply_streak_penalty
-from src.database_manager import update_merit_score
+from src.merit_engine import apply_merit_change, update_merit_score
+from src.database_manager import transaction, chunked
+from src import telemetry
+
+# Logic: If price hike is 2x the inflation rate, it's a penalty
+HIKE_FACTOR = 2
+PRICE_PENALTY = -5
+
+def price_hikes(last_prices, new_prices, inflation):
+    """Vectorized: (% increase per line, unfair mask). Lines without a previous price are never unfair."""
+    import numpy as np
+    last = np.asarray(last_prices, dtype=float)
+    new = np.asarray(new_prices, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(last > 0, (new - last) / last * 100, np.nan)
+    return pct, np.nan_to_num(pct, nan=-np.inf) > inflation * HIKE_FACTOR
 
 def evaluate_price_fairness(vendor_name, last_price, new_price):
     """Flags unfair price hikes compared to market inflation."""
     inflation = get_inflation_rate() # From RapidAPI
-    price_increase_pct = ((new_price - last_price) / last_price) * 100
-    
-    # Logic: If price hike is 2x the inflation rate, it's a penalty
-    if price_increase_pct > (inflation * 2):
-        penalty = -5
-        reason = f"Unfair price hike: {price_increase_pct:.1f}% vs {inflation}% inflation"
-        update_merit_score(vendor_name, penalty, reason)
+    pct, unfair = price_hikes([last_price], [new_price], inflation)
+
+    if unfair[0]:
+        reason = f"Unfair price hike: {pct[0]:.1f}% vs {inflation}% inflation"
+        update_merit_score(vendor_name, PRICE_PENALTY, reason)
         return False, reason
-    
-    return True, "Price hike within acceptable market bounds."
\ No newline at end of file
+
+    return True, "Price hike within acceptable market bounds."
+
+def _previous_prices(conn, vendor_id, item_names):
+    rows = []
+    for chunk in chunked(item_names):
+        rows += conn.execute(f"""
+            SELECT item_name, last_price FROM vendor_item_prices
+            WHERE vendor_id = ? AND item_name IN ({','.join('?' * len(chunk))})
+        """, [vendor_id] + chunk).fetchall()
+    return dict(rows)
+
+def record_price_history(conn, rows, now=None):
+    """
+    Moves vendor_item_prices forward and folds the lines into the market_index
+    running averages. `rows` are (vendor_id, item_name, price, date, doc_id).
+    A line dated before the stored last price (a late scan, a historic import)
+    still counts for the market average but does not replace the vendor's price.
+    """
+    now = now or datetime.now().isoformat()
+    conn.executemany("""
+        INSERT INTO vendor_item_prices (vendor_id, item_name, last_price, last_date, doc_id) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(vendor_id, item_name) DO UPDATE SET
+            last_price = excluded.last_price, last_date = excluded.last_date, doc_id = excluded.doc_id
+        WHERE excluded.last_date >= COALESCE(vendor_item_prices.last_date, '')
+    """, rows)
+    # Incremental mean: avg' = (avg * n + x) / (n + 1)
+    conn.executemany("""
+        INSERT INTO market_index (item_name, avg_price, sample_count, last_updated) VALUES (?, ?, 1, ?)
+        ON CONFLICT(item_name) DO UPDATE SET
+            avg_price = (COALESCE(avg_price, 0) * COALESCE(sample_count, 0) + excluded.avg_price) / (COALESCE(sample_count, 0) + 1),
+            sample_count = COALESCE(sample_count, 0) + 1,
+            last_updated = excluded.last_updated
+    """, [(item_name, price, now) for _, item_name, price, _, _ in rows])
+
+@telemetry.timed("logic_gate.check_invoice_prices")
+def check_invoice_prices(vendor_id, items, doc_id=None, date=None, inflation=None):
+    """
+    Pipeline stage for a received invoice: every line is compared with the price
+    this vendor charged last time in one vectorized pass, then
+    - vendor_item_prices is moved forward to the new prices,
+    - market_index running averages absorb the new lines,
+    - one merit penalty is booked if any line is an unfair hike.
+    Returns the flagged lines as a DataFrame (item_name, last_price, price, pct).
+    Pass `inflation` when called inside a transaction: the lookup may go to the network.
+    """
+    import pandas as pd  # loaded with the first received invoice, not at import
+
+    df = pd.DataFrame(items or [], columns=["name", "price"]).rename(columns={"name": "item_name"})
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df = df[df["item_name"].notna() & (df["price"] > 0)]
+    if df.empty:
+        return df.assign(last_price=[], pct=[])
+    # The same item twice on one invoice counts once, at its average price
+    df = df.groupby("item_name", as_index=False, sort=False)["price"].mean()
+
+    if inflation is None:
+        inflation = get_inflation_rate()  # one (cached) lookup per invoice, not per line
+    date = date or datetime.now().date().isoformat()
+    now = datetime.now().isoformat()
+
+    with transaction() as conn:
+        previous = _previous_prices(conn, vendor_id, df["item_name"].tolist())
+        df["last_price"] = df["item_name"].map(previous)
+        df["pct"], unfair = price_hikes(df["last_price"], df["price"], inflation)
+
+        lines = df[["item_name", "price"]].itertuples(index=False, name=None)
+        record_price_history(conn, [(vendor_id, name, price, date, doc_id) for name, price in lines], now)
+
+        flagged = df[unfair]
+        if not flagged.empty:
+            worst = flagged.loc[flagged["pct"].idxmax()]
+            reason = (f"Unfair price hike on {len(flagged)} item(s): worst {worst['item_name']} "
+                      f"{worst['pct']:.1f}% vs {inflation}% inflation")
+            apply_merit_change(vendor_id, PRICE_PENALTY, reason)
+
+    return flagged.reset_index(drop=True)
@@ -1,21 +1,132 @@
-import requests
 import os
+import json
+import time
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_inflation_rate():
+DEFAULT_INFLATION = 4.0
+INFLATION_TTL = float(os.getenv("INFLATION_TTL_SECONDS", "3600"))
+MARKET_CACHE_PATH = os.getenv("MARKET_CACHE_PATH", "database/market_cache.json")
+RETRY_AFTER_FAILURE = 60  # seconds to serve the default before trying the API again
+HTTP_TIMEOUT = (3.05, 5)  # (connect, read) seconds - never block a chat message or a scan
+
+# One pooled session: keep-alive instead of a fresh TLS handshake per call.
+# Built (and `requests` imported) on the first live fetch, not at import.
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        return _session
+
+def rapidapi_backend():
     """Fetches current inflation data using your RapidAPI key."""
     url = "https://cpi-inflation-calculator.p.rapidapi.com/inflation" # Example API URL
     headers = {
         "X-RapidAPI-Key": os.getenv("RAPIDAPI_KEY"),
         "X-RapidAPI-Host": "cpi-inflation-calculator.p.rapidapi.com"
     }
+    response = _get_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return float(response.json().get('rate', DEFAULT_INFLATION))
+
+
+class MarketDataProvider:
+    """
+    TTL cache (memory + JSON file on disk) in front of a pluggable backend.
+    - fresh value  -> returned from memory, no I/O
+    - stale value  -> returned immediately, one background thread refreshes it
+    - no value yet -> one synchronous fetch (bounded by HTTP_TIMEOUT), else the default
+    A backend is any zero-argument callable returning the rate, so tests can plug in a stub.
+    """
+
+    def __init__(self, backend=rapidapi_backend, ttl=INFLATION_TTL, cache_path=MARKET_CACHE_PATH, default=DEFAULT_INFLATION):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.default = default
+        self.value = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.refreshing = False
+        self._load_disk()
+
+    def set_backend(self, backend):
+        with self.lock:
+            self.backend = backend
+            self.value = None
+            self.fetched_at = 0.0
+
+    def _load_disk(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)["inflation_rate"]
+            self.value, self.fetched_at = float(entry["value"]), float(entry["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save_disk(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"inflation_rate": {"value": self.value, "fetched_at": self.fetched_at}}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️ Market cache write failed: {e}")
 
-    try:
-        response = requests.get(url, headers=headers)
-        data = response.json()
-        return data.get('rate', 4.0) # Default to 4.0 if API fails
-    except Exception as e:
-        print(f"❌ RapidAPI Error: {e}")
-        return 4.0
\ No newline at end of file
+    def _fetch(self):
+        try:
+            value = self.backend()
+        except Exception as e:
+            print(f"❌ RapidAPI Error: {e}")
+            return None
+        with self.lock:
+            self.value, self.fetched_at = value, time.time()
+            self._save_disk()
+        return value
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                self._fetch()
+            finally:
+                self.refreshing = False
+
+        threading.Thread(target=run, name="market-refresh", daemon=True).start()
+
+    def get_inflation_rate(self):
+        value, age = self.value, time.time() - self.fetched_at
+        if value is not None:
+            if age > self.ttl:
+                self._refresh_in_background()  # stale-while-revalidate
+            return value
+
+        value = self._fetch()
+        if value is None:
+            # Negative cache: serve the default (memory only) instead of re-paying the timeout per call
+            with self.lock:
+                self.value = self.default
+                self.fetched_at = time.time() - self.ttl + RETRY_AFTER_FAILURE
+            return self.default
+        return value
+
+
+provider = MarketDataProvider()
+
+def get_inflation_rate():
+    """Current inflation rate (%), served from the TTL cache."""
+    return provider.get_inflation_rate()
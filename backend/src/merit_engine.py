@@ -0,0 +1,163 @@
+from datetime import datetime
+from src.database_manager import get_conn, transaction, chunked
+
+# --- MERIT RULES ---
+# Consecutive administrative errors cost -1, -2, -2, -3, then -5 for every further one.
+# A clean scan resets the streak. Change PENALTY_STEPS and call rebuild_scores()
+# to re-score the whole history under the new rule.
+PENALTY_STEPS = [-1, -2, -2, -3, -5]
+BASE_MERIT = 100
+SCAN_REWARD = 1
+ADMIN_REASON = "Administrative error (Streak {})"
+ADMIN_PREFIX = "Administrative error"
+REWARD_REASON = "New document processed successfully"
+
+
+def penalty_for_streak(streak, steps=PENALTY_STEPS):
+    return steps[min(streak, len(steps)) - 1]
+
+
+def penalties_for_streaks(streaks, steps=PENALTY_STEPS):
+    """Vectorized penalty_for_streak() over an array of streak lengths (>= 1)."""
+    import numpy as np
+    steps = np.asarray(steps)
+    return steps[np.clip(np.asarray(streaks), 1, len(steps)) - 1]
+
+
+def apply_merit_change(entity_id, amount, reason):
+    """Updates the master score and logs the specific reason in the audit trail."""
+    with transaction() as conn:
+        conn.execute("UPDATE entity_master SET merit = merit + ? WHERE id = ?", (amount, entity_id))
+        conn.execute(
+            "INSERT INTO merit_audit_trail (entity_id, change, reason, timestamp) VALUES (?, ?, ?, ?)",
+            (entity_id, amount, reason, datetime.now().isoformat()),
+        )
+
+
+def update_merit_score(entity_name, amount, reason):
+    """apply_merit_change() by entity name (registers the entity if it is new)."""
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO entity_master (name) VALUES (?)", (entity_name,))
+        entity_id = conn.execute("SELECT id FROM entity_master WHERE name = ?", (entity_name,)).fetchone()[0]
+        apply_merit_change(entity_id, amount, reason)
+    return entity_id
+
+
+def apply_scan_outcomes(outcomes, reward=SCAN_REWARD, steps=PENALTY_STEPS):
+    """
+    Books a batch of scans in one transaction: `outcomes` is an iterable of
+    (entity_id, error_found) in scan order (an entity may appear many times),
+    or (entity_id, error_found, timestamp) to date the trail rows of past scans.
+    Streaks are read once, walked in memory, and written back with two
+    executemany() calls instead of three transactions per document.
+    Each scan logs its streak penalty (if any) followed by `reward`.
+    Returns {entity_id: new streak}.
+    """
+    now = datetime.now().isoformat()
+    outcomes = [(o[0], bool(o[1]), o[2] if len(o) > 2 and o[2] else now) for o in outcomes if o[0]]
+    if not outcomes:
+        return {}
+
+    ids = sorted({entity_id for entity_id, _, _ in outcomes})
+    with transaction() as conn:
+        streaks = {}
+        for chunk in chunked(ids):
+            rows = conn.execute(f"SELECT id, streak FROM entity_master WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            streaks.update({entity_id: streak or 0 for entity_id, streak in rows})
+
+        trail, deltas = [], dict.fromkeys(ids, 0)
+        for entity_id, error_found, at in outcomes:
+            streak = streaks.get(entity_id, 0)
+            if error_found:
+                streak += 1
+                penalty = penalty_for_streak(streak, steps)
+                trail.append((entity_id, penalty, ADMIN_REASON.format(streak), at))
+                deltas[entity_id] += penalty
+            else:
+                # Reset streak on a perfect scan
+                streak = 0
+            streaks[entity_id] = streak
+            if reward:
+                trail.append((entity_id, reward, REWARD_REASON, at))
+                deltas[entity_id] += reward
+
+        conn.executemany(
+            "UPDATE entity_master SET merit = merit + ?, streak = ? WHERE id = ?",
+            [(deltas[entity_id], streaks[entity_id], entity_id) for entity_id in ids],
+        )
+        conn.executemany("INSERT INTO merit_audit_trail (entity_id, change, reason, timestamp) VALUES (?, ?, ?, ?)", trail)
+
+    return {entity_id: streaks[entity_id] for entity_id in ids}
+
+
+def apply_streak_penalty(entity_id, error_found=False):
+    """Streak update + penalty for one scan (no reward). Returns the new streak."""
+    return apply_scan_outcomes([(entity_id, error_found)], reward=0).get(entity_id, 0)
+
+
+# --- BULK RECOMPUTATION ---
+
+def replay_trail(trail, steps=PENALTY_STEPS, base_merit=BASE_MERIT):
+    """
+    Re-scores a merit_audit_trail DataFrame (entity_id, change, reason; sorted in
+    booking order) under `steps`, without any per-row Python loop.
+
+    The trail has no row for a clean scan, but every scan logs a reward; a reward
+    that does not directly follow an administrative error is a clean scan and
+    starts a new streak. Returns (trail with new change/reason, per-entity scores).
+    """
+    import numpy as np  # numpy/pandas only load for a bulk replay, not per scan
+
+    df = trail.copy()
+    entity = df["entity_id"]
+    is_error = df["reason"].fillna("").str.startswith(ADMIN_PREFIX)
+    is_reward = df["reason"] == REWARD_REASON
+
+    previous_error = is_error.groupby(entity).shift(fill_value=False).astype(bool)
+    run = (is_reward & ~previous_error).groupby(entity).cumsum()
+    streak = is_error.astype(int).groupby([entity, run]).cumsum()
+
+    df["streak"] = streak
+    df["new_change"] = np.where(is_error, penalties_for_streaks(streak.where(is_error, 1), steps), df["change"])
+    df["new_reason"] = np.where(is_error, ADMIN_PREFIX + " (Streak " + streak.astype(str) + ")", df["reason"])
+
+    scores = df.groupby("entity_id").agg(merit=("new_change", "sum"), streak=("streak", "last"))
+    scores["merit"] += base_merit
+    return df, scores.reset_index()
+
+
+def rebuild_scores(steps=PENALTY_STEPS, base_merit=BASE_MERIT, dry_run=False):
+    """
+    Recomputes entity_master.merit / streak (and the penalty rows of the trail)
+    from merit_audit_trail. One read, a vectorized replay, and executemany()
+    writes in a single transaction. The v3 triggers keep merit_daily_summary in
+    step with the rewritten rows. Returns a DataFrame of old vs new scores.
+    """
+    import pandas as pd
+
+    conn = get_conn()
+    trail = pd.read_sql_query(
+        "SELECT rowid AS row_id, entity_id, change, reason FROM merit_audit_trail ORDER BY entity_id, timestamp, rowid", conn
+    )
+    current = pd.read_sql_query("SELECT id AS entity_id, name, merit AS old_merit, streak AS old_streak FROM entity_master", conn)
+
+    replayed, scores = replay_trail(trail, steps, base_merit)
+    report = current.merge(scores, on="entity_id", how="left")
+    # Entities without any history start from scratch
+    report["merit"] = report["merit"].fillna(base_merit).astype(int)
+    report["streak"] = report["streak"].fillna(0).astype(int)
+    if dry_run:
+        return report
+
+    changed = replayed[(replayed["new_change"] != replayed["change"]) | (replayed["new_reason"] != replayed["reason"])]
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE merit_audit_trail SET change = ?, reason = ? WHERE rowid = ?",
+            changed[["new_change", "new_reason", "row_id"]].itertuples(index=False, name=None),
+        )
+        conn.executemany(
+            "UPDATE entity_master SET merit = ?, streak = ? WHERE id = ?",
+            report[["merit", "streak", "entity_id"]].itertuples(index=False, name=None),
+        )
+    print(f"🧮 Rebuilt merit for {len(report)} entities ({len(changed)} trail rows re-scored)")
+    return report
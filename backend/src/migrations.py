@@ -0,0 +1,296 @@
+from src.database_manager import get_conn, transaction
+
+# The schema version lives in SQLite's own header (PRAGMA user_version), so a
+# database created by the old hard_reset_db() simply reports version 0 and is
+# upgraded in place. Append new steps to the END of MIGRATIONS; never edit a
+# step that has already shipped.
+
+BUCKET_TABLES = ["payment_to_be_sent_inv", "payment_to_be_done_rec", "payment_to_be_received_inv", "payment_received_rec"]
+
+# Column on each audit header that points at entity_master.id
+AUDIT_ENTITY_COLUMNS = {"inv_rec": "vendor_id", "inv_sent": "client_id", "rec_rec": "entity_id", "rec_sent": "entity_id"}
+
+
+def _v1_base_schema(cursor):
+    # --- LAYER 1: AUDIT TABLES (With Status Columns) ---
+    cursor.execute("CREATE TABLE IF NOT EXISTS inv_rec (id TEXT PRIMARY KEY, vendor_id INTEGER, date TEXT, total REAL, items_json TEXT, status TEXT DEFAULT 'Incomplete')")
+    cursor.execute("CREATE TABLE IF NOT EXISTS inv_sent (id TEXT PRIMARY KEY, client_id INTEGER, date TEXT, total REAL, items_json TEXT, status TEXT DEFAULT 'Incomplete')")
+    cursor.execute("CREATE TABLE IF NOT EXISTS rec_rec (id TEXT PRIMARY KEY, inv_id TEXT, date TEXT, amount REAL, items_json TEXT, status TEXT DEFAULT 'Completed')")
+    cursor.execute("CREATE TABLE IF NOT EXISTS rec_sent (id TEXT PRIMARY KEY, inv_id TEXT, date TEXT, amount REAL, items_json TEXT, status TEXT DEFAULT 'Completed')")
+
+    # --- LAYER 2: ITEM BUCKETS (With parent_id Links) ---
+    for table in BUCKET_TABLES:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                parent_id TEXT, 
+                item_name TEXT,
+                qty_total INTEGER,
+                qty_fulfilled INTEGER DEFAULT 0,
+                unit_price REAL,
+                status TEXT DEFAULT 'Incomplete'
+            )
+        """)
+
+    # --- LAYER 3: INTELLIGENCE ---
+    cursor.execute("CREATE TABLE IF NOT EXISTS entity_master (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, merit INTEGER DEFAULT 100, streak INTEGER DEFAULT 0)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS merit_audit_trail (entity_id INTEGER, change INTEGER, reason TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS market_index (item_name TEXT PRIMARY KEY, avg_price REAL, last_updated TEXT)")
+
+
+def _v2_hot_lookup_indexes(cursor):
+    # FIFO reconciliation: WHERE item_name = ? AND status != 'Completed' ORDER BY item_id.
+    # Partial (open lines only) + covering, so the lookup never touches the table.
+    # `status` is repeated as a column: SQLite won't treat the partial WHERE as covered.
+    for table in ["payment_to_be_received_inv", "payment_to_be_sent_inv"]:
+        cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table}_open_item
+            ON {table} (item_name, item_id, parent_id, qty_total, qty_fulfilled, status)
+            WHERE status != 'Completed'
+        """)
+
+    # Parent roll-up: COUNT(*) ... WHERE parent_id = ? AND status != 'Completed'
+    for table in BUCKET_TABLES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_parent ON {table} (parent_id, status)")
+
+    # Merit audit join per entity, and the dashboard's ORDER BY timestamp
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_merit_audit_trail_entity ON merit_audit_trail (entity_id, timestamp, change)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_merit_audit_trail_timestamp ON merit_audit_trail (timestamp)")
+
+
+def _v3_dashboard_aggregates(cursor):
+    # Charts read these O(items)/O(entities x days) tables instead of re-aggregating
+    # the full history. Triggers keep them exact for every write path.
+
+    # --- Per-item fulfillment + open exposure (payment_to_be_received_inv) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_fulfillment_summary (
+            item_name TEXT PRIMARY KEY,
+            qty_total INTEGER DEFAULT 0,
+            qty_fulfilled INTEGER DEFAULT 0,
+            open_exposure REAL DEFAULT 0
+        )
+    """)
+    exposure = "CASE WHEN {r}.status != 'Completed' THEN (COALESCE({r}.qty_total, 0) - COALESCE({r}.qty_fulfilled, 0)) * COALESCE({r}.unit_price, 0) ELSE 0 END"
+    add_new = f"""
+        INSERT INTO item_fulfillment_summary (item_name, qty_total, qty_fulfilled, open_exposure)
+        VALUES (COALESCE(NEW.item_name, ''), COALESCE(NEW.qty_total, 0), COALESCE(NEW.qty_fulfilled, 0), {exposure.format(r='NEW')})
+        ON CONFLICT(item_name) DO UPDATE SET
+            qty_total = qty_total + excluded.qty_total,
+            qty_fulfilled = qty_fulfilled + excluded.qty_fulfilled,
+            open_exposure = open_exposure + excluded.open_exposure;
+    """
+    remove_old = f"""
+        UPDATE item_fulfillment_summary SET
+            qty_total = qty_total - COALESCE(OLD.qty_total, 0),
+            qty_fulfilled = qty_fulfilled - COALESCE(OLD.qty_fulfilled, 0),
+            open_exposure = open_exposure - {exposure.format(r='OLD')}
+        WHERE item_name = COALESCE(OLD.item_name, '');
+    """
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_fulfillment_ins AFTER INSERT ON payment_to_be_received_inv BEGIN {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_fulfillment_upd AFTER UPDATE ON payment_to_be_received_inv BEGIN {remove_old} {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_fulfillment_del AFTER DELETE ON payment_to_be_received_inv BEGIN {remove_old} END")
+
+    cursor.execute("DELETE FROM item_fulfillment_summary")
+    cursor.execute(f"""
+        INSERT INTO item_fulfillment_summary (item_name, qty_total, qty_fulfilled, open_exposure)
+        SELECT COALESCE(item_name, ''), SUM(COALESCE(qty_total, 0)), SUM(COALESCE(qty_fulfilled, 0)), SUM({exposure.format(r='b')})
+        FROM payment_to_be_received_inv b
+        GROUP BY COALESCE(item_name, '')
+    """)
+
+    # --- Net merit change per entity per day (merit_audit_trail) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS merit_daily_summary (
+            entity_id INTEGER,
+            day TEXT,
+            net_change INTEGER DEFAULT 0,
+            PRIMARY KEY (entity_id, day)
+        ) WITHOUT ROWID
+    """)
+    add_new = """
+        INSERT INTO merit_daily_summary (entity_id, day, net_change)
+        VALUES (NEW.entity_id, substr(NEW.timestamp, 1, 10), COALESCE(NEW.change, 0))
+        ON CONFLICT(entity_id, day) DO UPDATE SET net_change = net_change + excluded.net_change;
+    """
+    remove_old = """
+        UPDATE merit_daily_summary SET net_change = net_change - COALESCE(OLD.change, 0)
+        WHERE entity_id = OLD.entity_id AND day = substr(OLD.timestamp, 1, 10);
+    """
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_merit_daily_ins AFTER INSERT ON merit_audit_trail BEGIN {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_merit_daily_upd AFTER UPDATE ON merit_audit_trail BEGIN {remove_old} {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_merit_daily_del AFTER DELETE ON merit_audit_trail BEGIN {remove_old} END")
+
+    cursor.execute("DELETE FROM merit_daily_summary")
+    cursor.execute("""
+        INSERT INTO merit_daily_summary (entity_id, day, net_change)
+        SELECT entity_id, substr(timestamp, 1, 10), SUM(COALESCE(change, 0))
+        FROM merit_audit_trail
+        GROUP BY entity_id, substr(timestamp, 1, 10)
+    """)
+
+
+def _v4_dashboard_paging(cursor):
+    # Receipts had no link to the entity they were booked against (invoices
+    # already carry vendor_id / client_id); the dashboard filters on it.
+    for table in ["rec_rec", "rec_sent"]:
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        if "entity_id" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN entity_id INTEGER")
+
+    # Keyset pages walk rowid newest-first; these serve the status / date / entity filters
+    for table, entity_col in AUDIT_ENTITY_COLUMNS.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table} (status)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_date ON {table} (date)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_entity ON {table} ({entity_col})")
+    for table in BUCKET_TABLES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table} (status)")
+
+
+def _v5_ingest_jobs(cursor):
+    # Durable queue for the headless pipeline (see job_queue.py). One row per
+    # document content hash, so re-dropping the same file never books it twice.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_hash TEXT UNIQUE NOT NULL,
+            path TEXT,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result_json TEXT,
+            doc_id TEXT,
+            error TEXT,
+            created_at REAL,
+            updated_at REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_state ON ingest_jobs (state, lease_expires)")
+
+
+def _v6_price_history(cursor):
+    # market_index becomes a running average: avg_price over sample_count invoice lines
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(market_index)")]
+    if "sample_count" not in columns:
+        cursor.execute("ALTER TABLE market_index ADD COLUMN sample_count INTEGER DEFAULT 0")
+
+    # Last price each vendor charged per item; the primary key is the (vendor, item) lookup index
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendor_item_prices (
+            vendor_id INTEGER,
+            item_name TEXT,
+            last_price REAL,
+            last_date TEXT,
+            doc_id TEXT,
+            PRIMARY KEY (vendor_id, item_name)
+        ) WITHOUT ROWID
+    """)
+
+    # Backfill from invoices already on the books (received invoices = what vendors charge us)
+    cursor.execute("""
+        INSERT INTO market_index (item_name, avg_price, sample_count, last_updated)
+        SELECT item_name, AVG(unit_price), COUNT(*), strftime('%Y-%m-%dT%H:%M:%S', 'now')
+        FROM payment_to_be_sent_inv
+        WHERE item_name IS NOT NULL AND unit_price > 0
+        GROUP BY item_name
+        ON CONFLICT(item_name) DO UPDATE SET avg_price = excluded.avg_price, sample_count = excluded.sample_count
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO vendor_item_prices (vendor_id, item_name, last_price, last_date, doc_id)
+        SELECT vendor_id, item_name, unit_price, date, parent_id FROM (
+            SELECT i.vendor_id, b.item_name, b.unit_price, i.date, b.parent_id,
+                   ROW_NUMBER() OVER (PARTITION BY i.vendor_id, b.item_name ORDER BY i.date DESC, b.item_id DESC) AS rn
+            FROM payment_to_be_sent_inv b JOIN inv_rec i ON i.id = b.parent_id
+            WHERE i.vendor_id IS NOT NULL AND b.item_name IS NOT NULL AND b.unit_price > 0
+        ) WHERE rn = 1
+    """)
+
+
+def _v7_fuzzy_match_audit(cursor):
+    # One row per receipt line settled against a differently spelled invoice line
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fuzzy_match_audit (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            receipt_id TEXT,
+            receipt_item TEXT,
+            matched_item TEXT,
+            score REAL,
+            qty INTEGER,
+            matched_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fuzzy_match_audit_receipt ON fuzzy_match_audit (receipt_id)")
+
+
+def _v8_document_items(cursor):
+    # Line items of all four document types as rows instead of an items_json blob
+    # per header, so per-item questions (what did we pay for X?) are plain SQL.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_items (
+            doc_type TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            line_no INTEGER NOT NULL,
+            item_name TEXT,
+            qty REAL,
+            price REAL,
+            PRIMARY KEY (doc_type, doc_id, line_no)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_items_item ON document_items (item_name, doc_type)")
+
+    for table in AUDIT_ENTITY_COLUMNS:
+        # A document's lines go with it
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_items_del AFTER DELETE ON {table} BEGIN
+                DELETE FROM document_items WHERE doc_type = '{table}' AND doc_id = OLD.id;
+            END
+        """)
+
+        # Backfill: parse every blob once, then drop it (the rows replace it).
+        # Legacy headers without an id cannot own rows; they keep their blob.
+        parseable = "{t}id IS NOT NULL AND {t}items_json IS NOT NULL AND json_valid({t}items_json) AND json_type({t}items_json) = 'array'"
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO document_items (doc_type, doc_id, line_no, item_name, qty, price)
+            SELECT '{table}', t.id, j.key + 1,
+                   json_extract(j.value, '$.name'), json_extract(j.value, '$.qty'), json_extract(j.value, '$.price')
+            FROM {table} t, json_each(t.items_json) j
+            WHERE {parseable.format(t='t.')}
+        """)
+        cursor.execute(f"UPDATE {table} SET items_json = NULL WHERE {parseable.format(t='')}")
+
+
+MIGRATIONS = [
+    (1, "base schema", _v1_base_schema),
+    (2, "hot lookup indexes", _v2_hot_lookup_indexes),
+    (3, "dashboard aggregates", _v3_dashboard_aggregates),
+    (4, "dashboard paging", _v4_dashboard_paging),
+    (5, "ingest jobs", _v5_ingest_jobs),
+    (6, "price history", _v6_price_history),
+    (7, "fuzzy match audit", _v7_fuzzy_match_audit),
+    (8, "document items", _v8_document_items),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(db_path=None):
+    return get_conn(db_path).execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(db_path=None):
+    """Brings the ledger up to LATEST_VERSION. Each step commits with its version bump."""
+    current = get_schema_version(db_path)
+    start = current
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with transaction(db_path) as conn:
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+        print(f"🧱 Migrated database to v{version}: {name}")
+        current = version
+
+    if current != start:
+        # Fresh statistics so the planner actually picks the new indexes
+        get_conn(db_path).execute("PRAGMA optimize")
+    return current
@@ -1,43 +1,108 @@
-from src.database_manager import save_audit_package, get_conn
-from src.merit_logic import check_administrative_merit, apply_merit_change
+import hashlib
+from src.database_manager import save_audit_package, transaction
+from src.merit_logic import book_scan
+from src.analyzer import reconcile_receipt
+from src.logic_gate import check_invoice_prices
+from src.market_watcher import get_inflation_rate
+from src.migrations import AUDIT_ENTITY_COLUMNS
+from src.doc_schema import DOC_TYPES
 from src.extractor import analyze_document  # Import the extractor!
+from src import telemetry
 
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def document_id(doc_hash):
+    """
+    The prompt does not ask for a document number, so extractions arrive without an
+    id. It is taken from the SHA-256 of the scanned file: a re-scan of the same file
+    maps to the same header row, two identical receipts scanned separately do not.
+    The Streamlit scanner and the headless worker (job_queue) both use this.
+    """
+    return f"DOC-{doc_hash[:12]}"
+
+@telemetry.timed("processor.commit_document")
+def commit_document(ai_json_result, file_path=None, inflation=None):
+    """
+    Unit of Work: writes one extracted document to the ledger as ONE transaction.
+    Audit header, buckets, entity registry, merit changes and the parent roll-up
+    either all land or none do (a single commit/fsync per document).
+    A document without an id gets the document_id() of `file_path` (the scan it was
+    extracted from); one already on the books is skipped.
+    The inflation rate for the price check of a received invoice is looked up
+    before the write lock is taken (a cold cache means an HTTP call); a caller
+    that already holds a transaction passes `inflation` in.
+    Returns the entity_id the document was booked against (None if skipped).
+    """
+    doc_type = ai_json_result.get('type')
+    if doc_type not in DOC_TYPES:
+        raise ValueError(f"Unknown document type: {doc_type!r}")
+    if not ai_json_result.get('id'):
+        if not file_path:
+            raise ValueError("Document has no id and no source file to derive one from")
+        ai_json_result['id'] = document_id(file_hash(file_path))
+
+    # Handle Vendor/Client Name
+    entity_name = ai_json_result.get('vendor_name') or ai_json_result.get('client_name')
+    if not entity_name:
+        entity_name = "Unknown Entity"
+
+    if doc_type == 'inv_rec' and inflation is None:
+        inflation = get_inflation_rate()
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # A re-scan would open its buckets and book its merit a second time
+        if cursor.execute(f"SELECT 1 FROM {doc_type} WHERE id = ?", (ai_json_result['id'],)).fetchone():
+            print(f"♻️ {ai_json_result['id']} is already in the ledger, skipping")
+            return None
+
+        # 1. Save Audit & Open Buckets
+        save_audit_package(ai_json_result)
+
+        # 2. Settle Receipt lines against open Invoice buckets (+ parent roll-up)
+        if ai_json_result.get('type') == 'rec_sent':
+            reconcile_receipt(ai_json_result.get('id'), ai_json_result.get('items', []), ai_json_result.get('date'))
+
+        # Ensure entity exists in Master Registry
+        cursor.execute("INSERT OR IGNORE INTO entity_master (name) VALUES (?)", (entity_name,))
+
+        # Get Entity ID
+        res = cursor.execute("SELECT id FROM entity_master WHERE name = ?", (entity_name,)).fetchone()
+        entity_id = res[0] if res else None
+
+        if entity_id and ai_json_result.get('type') in AUDIT_ENTITY_COLUMNS:
+            # Link the header to its vendor/client (dashboard entity filter)
+            entity_col = AUDIT_ENTITY_COLUMNS[ai_json_result['type']]
+            cursor.execute(f"UPDATE {ai_json_result['type']} SET {entity_col} = ? WHERE id = ?", (entity_id, ai_json_result.get('id')))
+
+        if entity_id:
+            # Price fairness: every line vs this vendor's last price (received invoices only)
+            if ai_json_result.get('type') == 'inv_rec':
+                check_invoice_prices(entity_id, ai_json_result.get('items', []), ai_json_result.get('id'), ai_json_result.get('date'), inflation)
+
+            # 3. Administrative Audit (Confidence check) + 4. Fulfillment Reward
+            confidence = ai_json_result.get('confidence_score')
+            book_scan(entity_id, error_found=(confidence is not None and confidence < 90))
+
+    return entity_id
+
+@telemetry.timed("processor.process_scanned_document")
 def process_scanned_document(file_path):
     """The central coordinator that links Audit, Buckets, and Merit."""
     
     print(f"🔍 AI Processor analyzing: {file_path}")
     
-    # 1. EXTRACT DATA (Call the AI)
+    # EXTRACT DATA (Call the AI)
     ai_json_result = analyze_document(file_path)
     
     if not ai_json_result:
         print(f"❌ Failed to extract data from {file_path}")
         return # Stop if extraction failed
 
-    # 2. Save Audit & Open Buckets
-    save_audit_package(ai_json_result)
-    
-    # Handle Vendor/Client Name
-    entity_name = ai_json_result.get('vendor_name') or ai_json_result.get('client_name')
-    if not entity_name:
-        entity_name = "Unknown Entity"
-
-    conn = get_conn()
-    cursor = conn.cursor()
-    
-    # Ensure entity exists in Master Registry
-    cursor.execute("INSERT OR IGNORE INTO entity_master (name) VALUES (?)", (entity_name,))
-    conn.commit()
-    
-    # Get Entity ID
-    res = cursor.execute("SELECT id FROM entity_master WHERE name = ?", (entity_name,)).fetchone()
-    entity_id = res[0] if res else None
-    conn.close()
-
-    if entity_id:
-        # 3. Administrative Audit (Confidence check)
-        confidence = ai_json_result.get('confidence_score', 100)
-        check_administrative_merit(entity_id, error_found=(confidence < 90))
-        
-        # 4. Fulfillment Reward
-        apply_merit_change(entity_id, 1, "New document processed successfully")
\ No newline at end of file
+    commit_document(ai_json_result, file_path)
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from src import database_manager
+
+# Guard rails for model-written SQL
+MAX_ROWS = int(os.getenv("BOT_SQL_MAX_ROWS", "200"))
+TIME_BUDGET_SECONDS = float(os.getenv("BOT_SQL_TIME_BUDGET", "2.0"))
+CACHE_SIZE = 256
+
+# Authorizer: a query may only read. Anything else (INSERT, PRAGMA, ATTACH, ...) is denied.
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_ALLOWED_START = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# One shared read-only connection: PRAGMA data_version is per connection, so the
+# cache key is only meaningful if every lookup reads it from the same one.
+_conn = None
+_conn_file = None        # (st_dev, st_ino) of the ledger _conn was opened on
+_lock = threading.Lock()
+_cache = OrderedDict()
+stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+class QueryRejected(ValueError):
+    pass
+
+
+def _file_id(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino
+
+
+def _get_ro_conn():
+    global _conn, _conn_file
+    path = os.path.abspath(database_manager.DB_PATH)
+    if _conn is not None and _conn_file != _file_id(path):
+        # The ledger file was replaced (init_db --reset in another process)
+        _close()
+    if _conn is None:
+        _conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        _conn.execute("PRAGMA query_only = 1")
+        _conn_file = _file_id(path)
+    return _conn
+
+
+def _close():
+    global _conn, _conn_file
+    if _conn is not None:
+        _conn.close()
+    _conn, _conn_file = None, None
+    _cache.clear()
+
+
+def reset():
+    """Drops the read-only connection and the result cache (the ledger was closed or replaced)."""
+    with _lock:
+        _close()
+
+
+database_manager.register_reset_hook(reset)
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+def normalize_sql(sql):
+    """Case/whitespace/semicolon-insensitive form used as the cache key (quoted text is kept as is)."""
+    parts = _QUOTED.split(sql.strip().rstrip(";"))
+    # Odd indexes are the quoted literals/identifiers captured by the split
+    return "".join(p if i % 2 else re.sub(r"\s+", " ", p).lower() for i, p in enumerate(parts)).strip()
+
+
+def validate_sql(sql):
+    """Returns (statement to run, cache key); raises QueryRejected."""
+    statement = sql.strip().rstrip(";").strip()
+    if not _ALLOWED_START.match(statement):
+        raise QueryRejected("Only SELECT / WITH queries are allowed.")
+    # A ';' inside a quoted literal ('a;b') is data, not a second statement
+    unquoted = _QUOTED.split(statement)[::2]
+    if any(";" in part for part in unquoted):
+        raise QueryRejected("Only one statement per query.")
+    return statement, normalize_sql(statement)
+
+
+def run_query(sql):
+    """
+    Runs one read-only query and returns
+        {"columns": [...], "rows": [...], "truncated": bool, "cached": bool, "elapsed_ms": float}
+    or {"error": "..."}. Results are LRU-cached by (normalized SQL, PRAGMA data_version),
+    so a repeated question is free until someone writes to the ledger.
+    """
+    try:
+        statement, normalized = validate_sql(sql)
+    except QueryRejected as e:
+        stats["errors"] += 1
+        return {"error": str(e)}
+
+    with _lock:
+        try:
+            conn = _get_ro_conn()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            stats["errors"] += 1
+            return {"error": f"Database unavailable: {e}"}
+
+        key = (normalized, data_version)
+        if key in _cache:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            return dict(_cache[key], cached=True)
+        stats["misses"] += 1
+
+        started = time.monotonic()
+        deadline = started + TIME_BUDGET_SECONDS
+        conn.set_authorizer(_authorizer)
+        # Returning non-zero aborts the statement ("interrupted")
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        try:
+            # The query as written: normalize_sql() lowercases, which is only fine for the key
+            cursor = conn.execute(statement)
+            rows = cursor.fetchmany(MAX_ROWS + 1)
+            columns = [d[0] for d in cursor.description or []]
+        except sqlite3.Error as e:
+            stats["errors"] += 1
+            message = "Query exceeded the time budget." if "interrupted" in str(e) else str(e)
+            return {"error": message}
+        finally:
+            conn.set_authorizer(None)
+            conn.set_progress_handler(None, 0)
+
+        result = {
+            "columns": columns,
+            "rows": [list(r) for r in rows[:MAX_ROWS]],
+            "truncated": len(rows) > MAX_ROWS,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+        }
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+        return dict(result, cached=False)
+
+
+def run_query_json(sql):
+    """run_query() serialized for a tool-call response."""
+    return json.dumps(run_query(sql), default=str)
@@ -0,0 +1,156 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+import functools
+from contextlib import contextmanager
+
+# Lightweight tracing: spans (stage timings) and counters (model calls, cache hits,
+# SQL statements, commits) are buffered in memory and flushed in batches to their
+# own SQLite file, so measuring never adds a commit to the ledger.
+# Plain sqlite3 on purpose: the ledger connections count their statements through
+# this module (database_manager), and the metrics writes must not count themselves.
+METRICS_DB_PATH = os.getenv("METRICS_DB_PATH", "database/metrics.db")
+ENABLED = os.getenv("TELEMETRY", "1") != "0"
+FLUSH_EVERY = 200        # buffered spans
+FLUSH_SECONDS = 5.0
+RETENTION_DAYS = 7
+
+_lock = threading.Lock()
+_spans = []              # (stage, started_at, duration_ms, ok)
+_counters = {}           # name -> delta since last flush
+_last_flush = time.time()
+_conn = None
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(METRICS_DB_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(METRICS_DB_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("CREATE TABLE IF NOT EXISTS spans (stage TEXT, started_at REAL, duration_ms REAL, ok INTEGER)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_started ON spans (started_at)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT, at REAL, value INTEGER)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_counters_at ON counters (at)")
+    return _conn
+
+
+def incr(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def record(stage, duration_ms, ok=True, started_at=None):
+    """Adds one finished span (for timings measured by hand)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _spans.append((stage, started_at or time.time() - duration_ms / 1000, duration_ms, int(ok)))
+        due = len(_spans) >= FLUSH_EVERY or time.time() - _last_flush > FLUSH_SECONDS
+    if due:
+        flush()
+
+
+@contextmanager
+def span(stage):
+    """Times the block under `stage`; a raised exception is recorded as ok=0."""
+    if not ENABLED:
+        yield
+        return
+    started_at, started = time.time(), time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(stage, (time.perf_counter() - started) * 1000, ok, started_at)
+
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flush():
+    """Writes the buffered spans and counters in one transaction."""
+    global _last_flush
+    with _lock:
+        spans, counters = _spans[:], dict(_counters)
+        _spans.clear()
+        _counters.clear()
+        _last_flush = time.time()
+    if not spans and not counters:
+        return
+    try:
+        conn = _get_conn()
+        with _lock:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT INTO spans VALUES (?, ?, ?, ?)", spans)
+                conn.executemany("INSERT INTO counters VALUES (?, ?, ?)", [(n, _last_flush, v) for n, v in counters.items()])
+                cutoff = time.time() - RETENTION_DAYS * 86400
+                conn.execute("DELETE FROM spans WHERE started_at < ?", (cutoff,))
+                conn.execute("DELETE FROM counters WHERE at < ?", (cutoff,))
+                conn.execute("COMMIT")
+            except BaseException:
+                # Otherwise the connection stays inside BEGIN and every later flush fails
+                conn.execute("ROLLBACK")
+                raise
+    except sqlite3.Error as e:
+        print(f"⚠️ Metrics flush failed: {e}")
+
+
+atexit.register(flush)
+
+
+def stage_summary(hours=24):
+    """Per-stage count / p50 / p95 / max (ms) and error count over the last `hours`."""
+    import pandas as pd  # only the dashboard reads metrics; recording never needs pandas
+    flush()
+    df = pd.read_sql_query("SELECT stage, duration_ms, ok FROM spans WHERE started_at >= ?",
+                           _get_conn(), params=[time.time() - hours * 3600])
+    if df.empty:
+        return pd.DataFrame(columns=["stage", "calls", "p50_ms", "p95_ms", "max_ms", "errors"])
+    grouped = df.groupby("stage")
+    summary = pd.DataFrame({
+        "calls": grouped.size(),
+        "p50_ms": grouped["duration_ms"].quantile(0.5),
+        "p95_ms": grouped["duration_ms"].quantile(0.95),
+        "max_ms": grouped["duration_ms"].max(),
+        "errors": grouped["ok"].apply(lambda s: int((s == 0).sum())),
+    }).round(2)
+    return summary.sort_values("p95_ms", ascending=False).reset_index()
+
+
+def counter_totals(hours=24):
+    """{counter name: total} over the last `hours`."""
+    flush()
+    rows = _get_conn().execute("SELECT name, SUM(value) FROM counters WHERE at >= ? GROUP BY name ORDER BY name",
+                               (time.time() - hours * 3600,)).fetchall()
+    return dict(rows)
+
+
+def stage_trend(stage, hours=24, bucket_minutes=15):
+    """p50 / p95 of one stage per time bucket (regression spotting)."""
+    import pandas as pd
+    flush()
+    df = pd.read_sql_query("SELECT started_at, duration_ms FROM spans WHERE stage = ? AND started_at >= ?",
+                           _get_conn(), params=[stage, time.time() - hours * 3600])
+    if df.empty:
+        return df
+    df["time"] = pd.to_datetime(df["started_at"], unit="s").dt.floor(f"{bucket_minutes}min")
+    grouped = df.groupby("time")["duration_ms"]
+    return pd.DataFrame({"p50_ms": grouped.quantile(0.5), "p95_ms": grouped.quantile(0.95)})
@@ -2,14 +2,20 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 from src.database_manager import get_conn
+from src.data_cache import cached
+from src import telemetry
 
+@telemetry.timed("viz_engine.fulfillment_chart")
+@cached
 def get_fulfillment_chart():
     """Bar chart showing item fulfillment across all buckets."""
     conn = get_conn()
+    # Reads the trigger-maintained summary (one row per item) - see migrations v3
     df = pd.read_sql_query("""
-        SELECT item_name, SUM(qty_total) as Total, SUM(qty_fulfilled) as Got 
-        FROM payment_to_be_received_inv 
-        GROUP BY item_name
+        SELECT item_name, qty_total as Total, qty_fulfilled as Got 
+        FROM item_fulfillment_summary 
+        WHERE qty_total != 0 OR qty_fulfilled != 0
+        ORDER BY item_name
     """, conn)
     conn.close()
 
@@ -21,13 +27,17 @@ def get_fulfillment_chart():
     fig.update_layout(barmode='group', title="Item Fulfillment Tracker", template="plotly_dark")
     return fig
 
+@telemetry.timed("viz_engine.merit_trend_chart")
+@cached
 def get_merit_trend_chart():
     """Line chart showing the history of merit changes."""
     conn = get_conn()
+    # One row per entity per day (merit_daily_summary), not one per audit event
     query = """
-        SELECT e.name, t.change, t.timestamp 
-        FROM merit_audit_trail t 
-        JOIN entity_master e ON t.entity_id = e.id
+        SELECT e.name, d.net_change AS change, d.day AS timestamp 
+        FROM merit_daily_summary d 
+        JOIN entity_master e ON d.entity_id = e.id
+        ORDER BY d.day
     """
     df = pd.read_sql_query(query, conn)
     conn.close()
@@ -36,20 +46,21 @@ def get_merit_trend_chart():
     
     # Calculate cumulative merit over time for each entity
     df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values('timestamp')
     df['cumulative_merit'] = df.groupby('name')['change'].cumsum() + 100
 
     fig = px.line(df, x='timestamp', y='cumulative_merit', color='name', 
                   title="Entity Reputation Trend", template="plotly_dark")
     return fig
 
+@telemetry.timed("viz_engine.debt_exposure_chart")
+@cached
 def get_debt_exposure_chart():
     """Pie chart showing where most 'Incomplete' money is tied up."""
     conn = get_conn()
     # Logic: (Total - Fulfilled) * Price = Outstanding Debt
     df = pd.read_sql_query("""
-        SELECT item_name, (qty_total - qty_fulfilled) * unit_price as Exposure 
-        FROM payment_to_be_received_inv WHERE status != 'Completed'
+        SELECT item_name, open_exposure as Exposure 
+        FROM item_fulfillment_summary WHERE open_exposure > 0
     """, conn)
     conn.close()
 
@@ -0,0 +1,52 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+# Every test session works on a throw-away ledger; nothing under backend/database is touched.
+# Run from backend/:  python -m pytest -q
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+WORKSPACE = tempfile.mkdtemp(prefix="erp-tests-")
+os.environ.update({
+    "ENGINE_DB_PATH": os.path.join(WORKSPACE, "engine_master.db"),
+    "EXTRACTION_CACHE_PATH": os.path.join(WORKSPACE, "extraction_cache.db"),
+    "METRICS_DB_PATH": os.path.join(WORKSPACE, "metrics.db"),
+    "MARKET_CACHE_PATH": os.path.join(WORKSPACE, "market_cache.json"),
+    "TELEMETRY": "0",
+})
+
+from src import database_manager, data_cache
+from src.migrations import run_migrations
+
+
+def _reset_ledger():
+    """Deletes the ledger file and migrates a new one; returns this thread's connection."""
+    database_manager.close_all()
+    for suffix in ("", "-wal", "-shm"):
+        path = database_manager.DB_PATH + suffix
+        if os.path.exists(path):
+            os.remove(path)
+    run_migrations()
+    data_cache.clear()
+    return database_manager.get_conn()
+
+
+@pytest.fixture
+def ledger():
+    """A fresh, migrated ledger; yields this thread's connection."""
+    yield _reset_ledger()
+    database_manager.close_all()
+
+
+@pytest.fixture
+def reset_ledger(ledger):
+    """For tests that need a second empty ledger halfway through."""
+    return _reset_ledger
+
+
+def pytest_sessionfinish(session, exitstatus):
+    database_manager.close_all()
+    shutil.rmtree(WORKSPACE, ignore_errors=True)
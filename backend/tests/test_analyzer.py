@@ -0,0 +1,63 @@
+from src.database_manager import MAX_IN_PARAMS, chunked, save_audit_package
+from src.analyzer import reconcile_receipt, update_parent_statuses
+
+
+def _invoice(doc_id, *items):
+    save_audit_package({"id": doc_id, "type": "inv_sent", "vendor_name": "Acme", "date": "2024-01-01",
+                        "items": [{"name": name, "qty": qty, "price": 2.0} for name, qty in items]})
+
+
+def _buckets(conn):
+    return conn.execute("""
+        SELECT parent_id, item_name, qty_fulfilled, status FROM payment_to_be_received_inv ORDER BY item_id
+    """).fetchall()
+
+
+def test_quantity_spills_over_into_the_next_invoice(ledger):
+    _invoice("INV-1", ("Pen", 3))
+    _invoice("INV-2", ("Pen", 5))
+
+    result = reconcile_receipt("REC-1", [{"name": "Pen", "qty": 6, "price": 2.0}], "2024-02-01")
+
+    assert result == {"invoices": ["INV-1", "INV-2"], "orphans": []}
+    assert _buckets(ledger) == [("INV-1", "Pen", 3, "Completed"), ("INV-2", "Pen", 3, "Partial")]
+    assert dict(ledger.execute("SELECT id, status FROM inv_sent")) == {"INV-1": "Completed", "INV-2": "Partial"}
+    assert ledger.execute("SELECT inv_id, amount FROM rec_sent WHERE id = 'REC-1'").fetchone() == ("INV-1", 12.0)
+
+
+def test_quantity_beyond_every_open_line_is_an_orphan(ledger):
+    _invoice("INV-1", ("Pen", 3), ("Stapler", 1))
+
+    result = reconcile_receipt("REC-1", [{"name": "Pen", "qty": 5, "price": 2.0}, {"name": "Glue", "qty": 1, "price": 1.0}])
+
+    assert result == {"invoices": ["INV-1"], "orphans": [("Pen", 2), ("Glue", 1)]}
+    # One line settled, the other still open
+    assert ledger.execute("SELECT status FROM inv_sent WHERE id = 'INV-1'").fetchone() == ("Partial",)
+
+
+def test_receipt_without_any_match_writes_nothing(ledger):
+    result = reconcile_receipt("REC-1", [{"name": "Pen", "qty": 1, "price": 2.0}])
+
+    assert result == {"invoices": [], "orphans": [("Pen", 1)]}
+    assert ledger.execute("SELECT COUNT(*) FROM rec_sent").fetchone() == (0,)
+
+
+def test_chunked_slices_below_the_parameter_limit():
+    slices = list(chunked(range(1201), size=500))
+
+    assert [len(s) for s in slices] == [500, 500, 201]
+    assert sum(slices, []) == list(range(1201))
+
+
+def test_roll_up_of_more_parents_than_one_statement_can_bind(ledger):
+    ids = [f"INV-{n}" for n in range(MAX_IN_PARAMS * 2 + 1)]
+    ledger.executemany("INSERT INTO inv_sent (id, status) VALUES (?, 'Incomplete')", [(i,) for i in ids])
+    ledger.executemany("""
+        INSERT INTO payment_to_be_received_inv (parent_id, item_name, qty_total, qty_fulfilled, status)
+        VALUES (?, 'Pen', 1, ?, ?)
+    """, [(i, n % 2, "Completed" if n % 2 else "Incomplete") for n, i in enumerate(ids)])
+
+    update_parent_statuses(ids, "inv_sent", "payment_to_be_received_inv")
+
+    statuses = dict(ledger.execute("SELECT id, status FROM inv_sent"))
+    assert statuses == {i: "Completed" if n % 2 else "Partial" for n, i in enumerate(ids)}
@@ -0,0 +1,118 @@
+import csv
+import pytest
+from src import bulk_io
+
+SOURCE = [
+    # id, type, vendor_name, date, total, status, inv_id, confidence_score, item_name, qty, price, qty_fulfilled
+    ["INV-1", "inv_sent", "Acme", "2024-01-05", "30", "", "", "95", "Pen", "10", "2", "4"],
+    ["INV-1", "inv_sent", "Acme", "2024-01-05", "30", "", "", "95", "Stapler", "1", "10", "1"],
+    ["INV-2", "inv_rec", "Globex", "2024-01-07", "12.5", "", "", "80", "Paper", "5", "2.5", ""],
+    ["REC-1", "rec_sent", "Acme", "2024-02-01", "10", "", "INV-1", "", "Pen", "4", "2", ""],
+    ["REC-2", "rec_rec", "Globex", "2024-02-03", "", "", "", "", "", "", "", ""],
+]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(bulk_io.COLUMNS)
+        writer.writerows(rows)
+    return str(path)
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_round_trip(ledger, reset_ledger, tmp_path):
+    # batch_rows=2 splits the file mid-way: documents must still load whole
+    summary = bulk_io.import_ledger(_write_csv(tmp_path / "in.csv", SOURCE), batch_rows=2)
+    assert summary == {"documents": 4, "lines": 4, "skipped": 0, "rejected": 0, "errors": []}
+
+    first = tmp_path / "first.csv"
+    assert bulk_io.export_ledger(str(first)) == {"inv_rec": 1, "inv_sent": 2, "rec_rec": 1, "rec_sent": 1}
+    rows = {(r[0], r[8]): r for r in _read_csv(first)[1:]}
+    assert rows[("INV-1", "Pen")][5] == "Partial" and float(rows[("INV-1", "Pen")][11]) == 4
+    assert float(rows[("INV-1", "Stapler")][11]) == 1
+    assert rows[("REC-1", "Pen")][6] == "INV-1"
+    assert rows[("REC-2", "")][2] == "Globex"
+
+    # What comes out goes back in unchanged
+    reset_ledger()
+    bulk_io.import_ledger(str(first))
+    second = tmp_path / "second.csv"
+    bulk_io.export_ledger(str(second))
+    assert _read_csv(second) == _read_csv(first)
+
+
+def test_parquet_round_trip(ledger, reset_ledger, tmp_path):
+    pytest.importorskip("pyarrow")
+    bulk_io.import_ledger(_write_csv(tmp_path / "in.csv", SOURCE))
+    bulk_io.export_ledger(str(tmp_path / "first.parquet"))
+    bulk_io.export_ledger(str(tmp_path / "first.csv"))
+
+    reset_ledger()
+    bulk_io.import_ledger(str(tmp_path / "first.parquet"))
+    bulk_io.export_ledger(str(tmp_path / "second.csv"))
+    assert _read_csv(tmp_path / "second.csv") == _read_csv(tmp_path / "first.csv")
+
+
+def test_reimport_skips_documents_already_loaded(ledger, tmp_path):
+    path = _write_csv(tmp_path / "in.csv", SOURCE)
+    bulk_io.import_ledger(path)
+
+    summary = bulk_io.import_ledger(path)
+
+    assert (summary["documents"], summary["skipped"]) == (0, 4)
+    assert ledger.execute("SELECT COUNT(*) FROM document_items").fetchone() == (4,)
+
+
+def test_invalid_documents_are_rejected_not_loaded(ledger, tmp_path):
+    rows = SOURCE + [
+        ["BAD-1", "inv_sent", "Acme", "05/01/2024", "", "", "", "", "Pen", "1", "2", ""],
+        ["BAD-2", "invoice", "Acme", "", "", "", "", "", "Pen", "1", "2", ""],
+        ["BAD-3", "inv_sent", "Acme", "", "", "", "", "", "Pen", "lots", "2", ""],
+    ]
+    rejects = tmp_path / "rejects.csv"
+
+    summary = bulk_io.import_ledger(_write_csv(tmp_path / "in.csv", rows), rejects_path=str(rejects))
+
+    assert (summary["documents"], summary["rejected"]) == (4, 3)
+    assert [r[0] for r in _read_csv(rejects)[1:]] == ["BAD-1", "BAD-2", "BAD-3"]
+    assert ledger.execute("SELECT COUNT(*) FROM inv_sent").fetchone() == (1,)
+
+
+def test_merit_is_only_booked_on_request_and_dated(ledger, tmp_path):
+    path = _write_csv(tmp_path / "in.csv", SOURCE)
+    bulk_io.import_ledger(path)
+    assert ledger.execute("SELECT COUNT(*) FROM merit_audit_trail").fetchone() == (0,)
+
+    ledger.execute("DELETE FROM inv_sent")
+    ledger.execute("DELETE FROM inv_rec")
+    bulk_io.import_ledger(path, book_merit=True)
+
+    booked = ledger.execute("SELECT DISTINCT timestamp FROM merit_audit_trail ORDER BY timestamp").fetchall()
+    assert booked == [("2024-01-05",), ("2024-01-07",)]
+
+
+@pytest.mark.parametrize("batch_rows", [1, 50_000])
+def test_a_document_with_split_lines_is_rejected_whole(ledger, tmp_path, batch_rows):
+    rows = [
+        ["INV-1", "inv_sent", "Acme", "2024-01-05", "", "", "", "", "Pen", "1", "2", ""],
+        ["INV-2", "inv_sent", "Acme", "2024-01-05", "", "", "", "", "Glue", "1", "2", ""],
+        ["INV-1", "inv_sent", "Acme", "2024-01-05", "", "", "", "", "Stapler", "1", "2", ""],
+    ]
+    rejects = tmp_path / "rejects.csv"
+
+    summary = bulk_io.import_ledger(_write_csv(tmp_path / "in.csv", rows), batch_rows=batch_rows, rejects_path=str(rejects))
+
+    assert (summary["documents"], summary["lines"], summary["skipped"], summary["rejected"]) == (1, 1, 0, 1)
+    assert "not next to each other" in summary["errors"][0]
+    assert [r[0] for r in _read_csv(rejects)[1:]] == ["INV-1"]
+    # Nothing of INV-1 is booked: half a document would pass for the whole one
+    assert ledger.execute("SELECT parent_id, item_name FROM payment_to_be_received_inv").fetchall() == [("INV-2", "Glue")]
+
+    # Sorted, the same lines load in full
+    summary = bulk_io.import_ledger(_write_csv(tmp_path / "sorted.csv", sorted(rows)))
+    assert (summary["documents"], summary["lines"], summary["skipped"]) == (1, 2, 1)
@@ -0,0 +1,67 @@
+from src import fuzzy_match
+from src.fuzzy_match import ItemNameIndex, normalize_name, similarity
+from src.database_manager import save_audit_package, transaction
+from src.analyzer import reconcile_receipt
+
+
+def _index(*names):
+    index = ItemNameIndex()
+    for name in names:
+        index.add(name)
+    return index
+
+
+def test_names_are_normalized_before_matching():
+    assert normalize_name("A4 Paper (500s)") == normalize_name("a4 paper 500") == "a4 paper 500"
+    assert normalize_name("Café Pens") == "cafe pen"
+    assert normalize_name("Glass") == "glass"  # 'ss' is not a plural
+
+
+def test_threshold_decides_what_counts_as_a_match():
+    index = _index("Blue Ballpoint Pen", "Stapler")
+
+    assert index.candidates("Blue Ballpoint Pens")[0][0] == "Blue Ballpoint Pen"
+    assert index.candidates("Blu Balpoint Pen", threshold=0.6)
+    assert index.candidates("Blu Balpoint Pen", threshold=0.95) == []
+    assert index.candidates("Red Marker") == []
+
+
+def test_candidates_never_include_the_name_itself():
+    assert _index("Stapler").candidates("Stapler") == []
+
+
+def test_numbers_must_agree():
+    index = _index("A4 Paper 500 sheets", "A4 Paper 250 sheets")
+
+    assert similarity(normalize_name("A4 Paper 500 sheets"), normalize_name("A4 Paper 250 sheet")) > fuzzy_match.FUZZY_THRESHOLD
+    assert [name for name, _ in index.candidates("A4 paper 250 sheet")] == ["A4 Paper 250 sheets"]
+    assert index.candidates("A4 paper sheets") == []
+
+
+def test_receipt_settles_an_ocr_variant_and_is_audited(ledger):
+    save_audit_package({"id": "INV-1", "type": "inv_sent", "vendor_name": "Acme",
+                        "items": [{"name": "A4 Paper 500s", "qty": 4, "price": 5.0}]})
+
+    result = reconcile_receipt("REC-1", [{"name": "A4 paper (500)", "qty": 4, "price": 5.0}])
+
+    assert result == {"invoices": ["INV-1"], "orphans": []}
+    assert ledger.execute("SELECT receipt_item, matched_item, qty FROM fuzzy_match_audit").fetchall() == [
+        ("A4 paper (500)", "A4 Paper 500s", 4)]
+
+
+def test_rolled_back_lines_leave_the_index(ledger):
+    try:
+        with transaction() as conn:
+            save_audit_package({"id": "INV-1", "type": "inv_sent", "vendor_name": "Acme",
+                                "items": [{"name": "Red Stapler", "qty": 1, "price": 5.0}]})
+            assert fuzzy_match.find_candidates(conn.cursor(), "Red Staplers")
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    # The next line reuses the rolled-back item_id; it must still be indexed
+    save_audit_package({"id": "INV-2", "type": "inv_sent", "vendor_name": "Acme",
+                        "items": [{"name": "Green Folder", "qty": 1, "price": 5.0}]})
+
+    with transaction() as conn:
+        assert fuzzy_match.find_candidates(conn.cursor(), "Red Staplers") == []
+        assert fuzzy_match.find_candidates(conn.cursor(), "Green Folders")[0][0] == "Green Folder"
@@ -0,0 +1,86 @@
+import pytest
+from src import database_manager, ingestion, job_queue, logic_gate, processor
+from src.processor import document_id, file_hash
+
+INVOICE = {"type": "inv_sent", "vendor_name": "Acme", "date": "2024-03-01", "total": 20.0,
+           "items": [{"name": "Pen", "qty": 10, "price": 2.0}], "confidence_score": 95}
+
+
+def _scan(tmp_path, name=b"invoice", file_name="inv.pdf"):
+    path = tmp_path / file_name
+    path.write_bytes(name)
+    return str(path)
+
+
+def _run_worker(path, result):
+    """enqueue -> claim -> mark_extracted -> commit_extracted, as run_pipeline does."""
+    job_queue.enqueue(path)
+    job = job_queue.claim(worker_id="w1")
+    assert job_queue.mark_extracted(job, dict(result), worker_id="w1")
+    return job_queue.commit_extracted()
+
+
+def test_worker_books_a_file_under_its_document_id(ledger, tmp_path):
+    path = _scan(tmp_path)
+
+    committed = _run_worker(path, INVOICE)
+
+    assert [job["path"] for job in committed] == [path]
+    assert ledger.execute("SELECT id FROM inv_sent").fetchall() == [(document_id(file_hash(path)),)]
+    assert job_queue.counts() == {"committed": 1}
+
+
+def test_scanner_and_worker_book_the_same_file_once(ledger, tmp_path, monkeypatch):
+    path = _scan(tmp_path)
+    monkeypatch.setattr(ingestion, "analyze_document", lambda p: dict(INVOICE))
+
+    [scanned] = list(ingestion.ingest_files([path]))
+    _run_worker(path, INVOICE)
+
+    assert ledger.execute("SELECT id FROM inv_sent").fetchall() == [(scanned["doc_id"],)]
+    assert ledger.execute("SELECT COUNT(*) FROM payment_to_be_received_inv").fetchone() == (1,)
+    assert ledger.execute("SELECT merit FROM entity_master WHERE name = 'Acme'").fetchone() == (101,)
+    assert job_queue.counts() == {"committed": 1}
+
+
+def test_same_content_is_one_job(ledger, tmp_path):
+    first = job_queue.enqueue(_scan(tmp_path, file_name="a.pdf"))
+    again = job_queue.enqueue(_scan(tmp_path, file_name="b.pdf"))
+
+    assert first["id"] == again["id"] and again["path"].endswith("b.pdf")
+
+
+def test_a_leased_job_is_not_claimed_twice_until_the_lease_runs_out(ledger, tmp_path):
+    job_queue.enqueue(_scan(tmp_path))
+    job = job_queue.claim(worker_id="w1", lease_seconds=60)
+
+    assert job_queue.claim(worker_id="w2") is None
+    assert not job_queue.heartbeat(job["id"], worker_id="w2")
+
+    ledger.execute("UPDATE ingest_jobs SET lease_expires = 0")
+    taken_over = job_queue.claim(worker_id="w2")
+    assert taken_over["id"] == job["id"] and taken_over["attempts"] == 2
+    # The first worker's late answer is ignored
+    assert not job_queue.mark_extracted(job, dict(INVOICE), worker_id="w1")
+
+
+def test_failed_attempts_end_in_failed(ledger, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_ATTEMPTS", 2)
+    job_queue.enqueue(_scan(tmp_path))
+
+    assert job_queue.mark_failed(job_queue.claim(worker_id="w1"), "boom", worker_id="w1") == "queued"
+    assert job_queue.mark_failed(job_queue.claim(worker_id="w1"), "boom", worker_id="w1") == "failed"
+    assert job_queue.claim(worker_id="w1") is None
+    assert job_queue.requeue_failed() == 1
+
+
+def test_worker_looks_up_inflation_before_the_write_lock(ledger, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(job_queue, "get_inflation_rate", lambda: calls.append(database_manager.get_conn().in_transaction) or 3.0)
+    monkeypatch.setattr(processor, "get_inflation_rate", lambda: pytest.fail("looked up inside the transaction"))
+    monkeypatch.setattr(logic_gate, "get_inflation_rate", lambda: pytest.fail("looked up inside the transaction"))
+
+    _run_worker(_scan(tmp_path), dict(INVOICE, type="inv_rec"))
+
+    assert calls == [False]
+    assert job_queue.counts() == {"committed": 1}
@@ -0,0 +1,49 @@
+import pandas as pd
+from src.merit_engine import (
+    BASE_MERIT, apply_scan_outcomes, rebuild_scores, replay_trail, update_merit_score,
+)
+
+SCANS = [True, True, False, True, True, True, True, True, False, True]  # error_found per scan
+
+
+def _trail(conn):
+    return pd.read_sql_query("SELECT entity_id, change, reason FROM merit_audit_trail ORDER BY entity_id, timestamp, rowid", conn)
+
+
+def _master(conn):
+    return {entity_id: (merit, streak) for entity_id, merit, streak in conn.execute("SELECT id, merit, streak FROM entity_master")}
+
+
+def test_replay_matches_the_booked_scores(ledger):
+    acme = update_merit_score("Acme", 5, "Manual bonus")
+    globex = update_merit_score("Globex", -3, "Late delivery")
+    apply_scan_outcomes([(acme, error) for error in SCANS] + [(globex, False), (globex, True)])
+
+    _, scores = replay_trail(_trail(ledger))
+
+    replayed = {row.entity_id: (row.merit, row.streak) for row in scores.itertuples()}
+    assert replayed == _master(ledger)
+
+
+def test_booked_penalties_follow_the_streak(ledger):
+    acme = update_merit_score("Acme", 0, "Registered")
+    apply_scan_outcomes([(acme, error) for error in SCANS])
+
+    penalties = [change for change, reason in ledger.execute("SELECT change, reason FROM merit_audit_trail ORDER BY rowid")
+                 if reason.startswith("Administrative error")]
+    # -1, -2 | reset | -1, -2, -2, -3, -5 | reset | -1
+    assert penalties == [-1, -2, -1, -2, -2, -3, -5, -1]
+    assert _master(ledger)[acme] == (BASE_MERIT + len(SCANS) + sum(penalties), 1)
+
+
+def test_rebuild_rescores_history_under_new_steps(ledger):
+    acme = update_merit_score("Acme", 5, "Manual bonus")
+    apply_scan_outcomes([(acme, error) for error in SCANS])
+
+    report = rebuild_scores(steps=[-10])
+
+    # 8 errors at -10, 10 scan rewards, the manual bonus
+    assert report.set_index("entity_id").loc[acme, ["merit", "streak"]].tolist() == [BASE_MERIT - 80 + 10 + 5, 1]
+    assert _master(ledger)[acme] == (BASE_MERIT - 80 + 10 + 5, 1)
+    _, scores = replay_trail(_trail(ledger), steps=[-10])
+    assert scores.set_index("entity_id").loc[acme, "merit"] == BASE_MERIT - 80 + 10 + 5
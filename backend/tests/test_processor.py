@@ -0,0 +1,78 @@
+import pytest
+from src import database_manager, ingestion, logic_gate, processor
+from src.processor import commit_document, document_id, file_hash
+
+RECEIPT = {"type": "rec_rec", "vendor_name": "Corner Shop", "date": "2024-03-01", "total": 4.5,
+           "items": [{"name": "Coffee", "qty": 1, "price": 4.5}], "confidence_score": 95}
+
+
+def _scan(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def _headers(conn, table="rec_rec"):
+    return [doc_id for doc_id, in conn.execute(f"SELECT id FROM {table} ORDER BY id")]
+
+
+def test_id_comes_from_the_scanned_file(ledger, tmp_path):
+    path = _scan(tmp_path, "a.jpg", b"receipt one")
+    doc = dict(RECEIPT)
+
+    commit_document(doc, path)
+
+    assert doc["id"] == document_id(file_hash(path)) and doc["id"].startswith("DOC-")
+    assert _headers(ledger) == [doc["id"]]
+
+
+def test_identical_receipts_from_different_scans_are_both_booked(ledger, tmp_path):
+    first = _scan(tmp_path, "a.jpg", b"receipt one")
+    second = _scan(tmp_path, "b.jpg", b"receipt two")  # same shop, same day, same amount
+
+    commit_document(dict(RECEIPT), first)
+    commit_document(dict(RECEIPT), second)
+
+    assert len(_headers(ledger)) == 2
+    assert ledger.execute("SELECT COUNT(*) FROM merit_audit_trail").fetchone() == (2,)
+
+
+def test_the_same_file_is_only_booked_once(ledger, tmp_path):
+    path = _scan(tmp_path, "a.jpg", b"receipt one")
+    copy = _scan(tmp_path, "a (copy).jpg", b"receipt one")
+
+    assert commit_document(dict(RECEIPT), path) is not None
+    assert commit_document(dict(RECEIPT), copy) is None
+
+    assert len(_headers(ledger)) == 1
+    assert ledger.execute("SELECT merit FROM entity_master WHERE name = 'Corner Shop'").fetchone() == (101,)
+
+
+def test_documents_without_an_id_or_a_known_type_are_refused(ledger):
+    with pytest.raises(ValueError, match="no id"):
+        commit_document(dict(RECEIPT))
+    with pytest.raises(ValueError, match="Unknown document type"):
+        commit_document(dict(RECEIPT, type="receipt", id="R-1"))
+    assert _headers(ledger) == []
+
+
+def test_ingest_files_keys_each_document_on_its_file(ledger, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion, "analyze_document", lambda path: dict(RECEIPT))
+    paths = [_scan(tmp_path, "a.jpg", b"receipt one"), _scan(tmp_path, "b.jpg", b"receipt two")]
+
+    results = list(ingestion.ingest_files(paths, max_workers=2))
+
+    assert all(r["ok"] for r in results)
+    assert sorted(r["doc_id"] for r in results) == sorted(document_id(file_hash(p)) for p in paths)
+    assert _headers(ledger) == sorted(r["doc_id"] for r in results)
+
+
+def test_inflation_is_looked_up_before_the_write_lock(ledger, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(processor, "get_inflation_rate", lambda: calls.append(database_manager.get_conn().in_transaction) or 3.0)
+    monkeypatch.setattr(logic_gate, "get_inflation_rate", lambda: pytest.fail("looked up inside the transaction"))
+    invoice = {"type": "inv_rec", "vendor_name": "Acme", "items": [{"name": "Pen", "qty": 1, "price": 2.0}]}
+
+    commit_document(invoice, _scan(tmp_path, "inv.pdf", b"invoice"))
+
+    assert calls == [False]
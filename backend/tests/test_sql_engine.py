@@ -0,0 +1,59 @@
+import pytest
+from src import database_manager, sql_engine
+from src.sql_engine import QueryRejected, run_query, validate_sql
+from src.database_manager import transaction
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("DELETE FROM entity_master", "Only SELECT / WITH"),
+    ("UPDATE entity_master SET merit = 0", "Only SELECT / WITH"),
+    ("PRAGMA table_info(inv_rec)", "Only SELECT / WITH"),
+    ("ATTACH 'other.db' AS other", "Only SELECT / WITH"),
+    ("", "Only SELECT / WITH"),
+    ("SELECT 1; DROP TABLE inv_rec", "one statement"),
+    ("SELECT 'a'; SELECT 'b'", "one statement"),
+    ("SELECT 1 -- comment\n; DELETE FROM inv_rec", "one statement"),
+])
+def test_validate_sql_rejects(sql, message):
+    with pytest.raises(QueryRejected, match=message):
+        validate_sql(sql)
+
+
+def test_validate_sql_keeps_the_statement_as_written():
+    statement, key = validate_sql("  SELECT name FROM entity_master WHERE name = 'Acme;Co'  ;  ")
+
+    assert statement == "SELECT name FROM entity_master WHERE name = 'Acme;Co'"
+    assert key == "select name from entity_master where name = 'Acme;Co'"
+    assert validate_sql("with x as (select 1) select * from x")[0].startswith("with")
+
+
+def test_pragmas_are_denied_inside_a_select(ledger):
+    result = run_query("WITH x AS (SELECT 1) SELECT * FROM x, pragma_table_info('inv_rec')")
+
+    assert "not authorized" in result["error"]
+
+
+def test_results_are_cached_until_the_ledger_changes(ledger):
+    with transaction() as conn:
+        conn.execute("INSERT INTO entity_master (name) VALUES ('Acme')")
+    query = "SELECT name FROM entity_master WHERE name = 'Acme'"
+
+    assert run_query(query)["rows"] == [["Acme"]]
+    assert run_query("select name  from ENTITY_MASTER where name = 'Acme';")["cached"] is True
+    # Quoted text is not case-folded: a different literal is a different query
+    upper = run_query("SELECT name FROM entity_master WHERE name = 'ACME'")
+    assert upper["cached"] is False and upper["rows"] == []
+
+    with transaction() as conn:
+        conn.execute("UPDATE entity_master SET name = 'Acme Ltd'")
+    fresh = run_query(query)
+    assert fresh["cached"] is False and fresh["rows"] == []
+
+
+def test_close_all_drops_the_read_only_connection(ledger):
+    run_query("SELECT COUNT(*) FROM entity_master")
+    assert sql_engine._conn is not None
+
+    database_manager.close_all()
+
+    assert sql_engine._conn is None